@@ -12,9 +12,9 @@ async def generate_docs(request: dict):
     # README prompt
     prompt_readme = "You are a technical writer. Create a README.md for this project.\n\nProject files summary:\n" + project_summary + "\nReturn ONLY the markdown content, starting with '# Project Title'. Include: Description, Features, Installation, Usage, File structure, Technologies used."
     try:
-        import ollama
+        from src.core.ollama_client import get_ollama
         import re
-        response = ollama.chat(model="mistral", messages=[{"role": "user", "content": prompt_readme}])
+        response = await get_ollama().chat(model="mistral", messages=[{"role": "user", "content": prompt_readme}])
         readme = response['message']['content'].strip()
         readme = re.sub(r'```markdown\n?', '', readme)
         readme = re.sub(r'```\n?', '', readme)
@@ -24,7 +24,7 @@ async def generate_docs(request: dict):
     # Diagram prompt
     prompt_diagram = "Generate a Mermaid.js architecture diagram for this project.\n\nProject files:\n" + project_summary + "\nReturn ONLY the mermaid code, starting with '```mermaid' and ending with '```'."
     try:
-        response = ollama.chat(model="mistral", messages=[{"role": "user", "content": prompt_diagram}])
+        response = await get_ollama().chat(model="mistral", messages=[{"role": "user", "content": prompt_diagram}])
         diagram = response['message']['content'].strip()
         if not diagram.startswith('```mermaid'):
             diagram = "```mermaid\n" + diagram + "\n```"
@@ -33,21 +33,35 @@ async def generate_docs(request: dict):
     
     return {"docs": readme, "diagram": diagram}
 import asyncio
-import ollama
+import os
+from fastapi.responses import StreamingResponse
+from src.core.ollama_client import get_ollama
 import json
 
+# Judge once this many proposals are in (0: all agents); agents still running are dropped.
+DEBATE_QUORUM = int(os.getenv("DEBATE_QUORUM", "0"))
+# Judge with whatever has arrived after this many seconds.
+DEBATE_TIMEOUT = float(os.getenv("DEBATE_TIMEOUT", "120"))
+
 class DebateAgent:
     def __init__(self, name, role, system_prompt):
         self.name = name
         self.role = role
         self.system_prompt = system_prompt
 
-    async def generate(self, task, context):
+    def _messages(self, task, context):
         prompt = f"{self.system_prompt}\n\nTask: {task}\n\nContext: {context}\n\nPropose a solution."
-        response = ollama.chat(model="mistral", messages=[{"role": "user", "content": prompt}])
+        return [{"role": "user", "content": prompt}]
+
+    async def generate(self, task, context):
+        response = await get_ollama().chat(model="mistral", messages=self._messages(task, context))
         return response['message']['content']
 
-async def judge(proposals, task):
+    async def stream(self, task, context):
+        async for chunk in get_ollama().stream_chat(model="mistral", messages=self._messages(task, context)):
+            yield chunk
+
+def _judge_messages(proposals, task):
     combined = "\n\n".join([f"Agent {name}:\n{text}" for name, text in proposals])
     judge_prompt = f"""You are a judge. Evaluate the following proposals for the task: {task}.
 
@@ -55,9 +69,71 @@ Proposals:
 {combined}
 
 Select the best parts from each and combine them into a final answer. Return ONLY the final code/markdown."""
-    response = ollama.chat(model="mistral", messages=[{"role": "user", "content": judge_prompt}])
+    return [{"role": "user", "content": judge_prompt}]
+
+async def judge(proposals, task):
+    response = await get_ollama().chat(model="mistral", messages=_judge_messages(proposals, task))
     return response['message']['content']
 
+async def _propose(agent, task, context, queue):
+    parts = []
+    try:
+        async for chunk in agent.stream(task, context):
+            parts.append(chunk)
+            await queue.put({"type": "proposal_chunk", "agent": agent.name, "text": chunk})
+        await queue.put({"type": "proposal", "agent": agent.name, "text": "".join(parts)})
+    except Exception as e:
+        await queue.put({"type": "agent_error", "agent": agent.name, "message": str(e)})
+
+async def run_debate(agents, task, context, quorum=DEBATE_QUORUM, timeout=DEBATE_TIMEOUT):
+    """Run all agents concurrently and stream their proposals, then the judge.
+
+    The judge starts once `quorum` proposals are in, or after `timeout`
+    seconds with whatever has arrived; agents still running are cancelled
+    and reported as dropped. A quorum of 0 waits for every agent.
+    """
+    quorum = max(1, min(quorum or len(agents), len(agents)))
+    queue = asyncio.Queue()
+    tasks = [asyncio.create_task(_propose(a, task, context, queue)) for a in agents]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    proposals, finished = [], set()
+    try:
+        while len(proposals) < quorum and len(finished) < len(agents):
+            try:
+                event = await asyncio.wait_for(queue.get(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if event["type"] == "proposal":
+                proposals.append((event["agent"], event["text"]))
+            if event["type"] != "proposal_chunk":
+                finished.add(event["agent"])
+            yield event
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    # Agents that finished while the loop was stopping have already queued
+    # their proposal; keep it instead of reporting them as dropped.
+    while not queue.empty():
+        event = queue.get_nowait()
+        if event["type"] == "proposal":
+            proposals.append((event["agent"], event["text"]))
+        if event["type"] != "proposal_chunk":
+            finished.add(event["agent"])
+        yield event
+    dropped = [a.name for a in agents if a.name not in finished]
+    if dropped:
+        yield {"type": "dropped", "agents": dropped}
+    if not proposals:
+        yield {"type": "error", "message": "No agent produced a proposal"}
+        return
+    parts = []
+    async for chunk in get_ollama().stream_chat(model="mistral", messages=_judge_messages(proposals, task)):
+        parts.append(chunk)
+        yield {"type": "judge_chunk", "text": chunk}
+    yield {"type": "final", "final": "".join(parts), "proposals": proposals, "dropped": dropped}
+
 @app.post("/api/debate")
 async def debate_endpoint(request: dict):
     task = request.get("task", "")
@@ -68,9 +144,16 @@ async def debate_endpoint(request: dict):
         DebateAgent("Tester", "quality", "You ensure correctness, edge cases, and testability."),
         DebateAgent("Security", "safety", "You look for vulnerabilities and security best practices.")
     ]
-    proposals = []
-    for agent in agents:
-        proposal = await agent.generate(task, context)
-        proposals.append((agent.name, proposal))
-    final = await judge(proposals, task)
-    return {"final": final, "proposals": proposals}
+    events = run_debate(agents, task, context,
+                        request.get("quorum", DEBATE_QUORUM),
+                        request.get("timeout", DEBATE_TIMEOUT))
+    if request.get("stream"):
+        async def ndjson():
+            async for event in events:
+                yield json.dumps(event) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    async for event in events:
+        if event["type"] == "error":
+            return {"error": event["message"]}
+        if event["type"] == "final":
+            return {"final": event["final"], "proposals": event["proposals"], "dropped": event["dropped"]}
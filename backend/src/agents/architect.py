@@ -1,4 +1,4 @@
-﻿import ollama
+﻿from src.core.ollama_client import get_ollama
 import json
 
 class Architect:
@@ -15,7 +15,7 @@ class Architect:
 }
 Only output valid JSON."""
         
-        response = ollama.generate(model=self.model, prompt=prompt, system=system)
+        response = await get_ollama().generate(model=self.model, prompt=prompt, system=system)
         try:
             return json.loads(response['response'])
         except:
@@ -1,4 +1,4 @@
-﻿import ollama
+﻿from src.core.ollama_client import get_ollama
 import asyncio
 import json
 
@@ -22,7 +22,7 @@ Requirements: {json.dumps(requirements)}
 Plan: {plan.get('description')}
 Only output the file content, no explanations or markdown."""
             
-            response = ollama.generate(model=self.model, prompt=f"Write {task}", system=system)
+            response = await get_ollama().generate(model=self.model, prompt=f"Write {task}", system=system)
             content = response['response'].strip()
             
             files[task] = content
@@ -1,6 +1,6 @@
 ﻿# backend/src/agents/merge_agent.py
 import re
-import ollama
+from src.core.ollama_client import get_ollama
 from typing import Dict, List
 
 class MergeAgent:
@@ -21,5 +21,5 @@ class MergeAgent:
 
     async def fix_import_error(self, file_path: str, content: str, error_msg: str) -> str:
         system = f"Fix the following import error in {file_path}. Output only the corrected code.\nError: {error_msg}"
-        response = ollama.generate(model=self.model, prompt=content, system=system)
+        response = await get_ollama().generate(model=self.model, prompt=content, system=system)
         return response.get('response', content)
@@ -1,39 +1,179 @@
 ﻿# backend/src/agents/parallel_coder_agent.py
-import asyncio
+import os
 import json
-import ollama
+import asyncio
+import logging
+import httpx
 from typing import Dict, List
+from src.core.ollama_client import MODEL_CONCURRENCY, get_ollama
 from src.schemas.file_plan import FilePlan, FilePlanEntry
 
+logger = logging.getLogger('parallel_coder')
+# Requests the Ollama server runs at once per model; more only wait in its
+# queue, so the limiter never grows past this. Match the server's setting.
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", str(MODEL_CONCURRENCY)))
+
+def topological_levels(entries: List[FilePlanEntry]) -> List[List[FilePlanEntry]]:
+    """Group plan entries into levels whose files only import earlier levels.
+
+    Imports that are not part of the plan are ignored. Files caught in an
+    import cycle are placed together in a final level.
+    """
+    by_path = {e.path: e for e in entries}
+    deps = {e.path: {i for i in e.imports if i in by_path and i != e.path} for e in entries}
+    levels, done = [], set()
+    remaining = [e.path for e in entries]
+    while remaining:
+        ready = [p for p in remaining if deps[p] <= done]
+        if not ready:
+            logger.warning(f'Import cycle between {remaining}, generating them together')
+            ready = remaining
+        levels.append([by_path[p] for p in ready])
+        done.update(ready)
+        remaining = [p for p in remaining if p not in done]
+    return levels
+
+class AdaptiveLimiter:
+    """Concurrency limit that follows the provider's rate-limit signals.
+
+    Grows by one slot after each clean response up to max_limit, halves on
+    429/503, and shrinks to the provider's advertised remaining request
+    budget when it sends x-ratelimit-remaining-requests. Ollama sends no
+    rate-limit headers (only a 503 once its queue is full), so against it
+    max_limit is the real bound and should match OLLAMA_NUM_PARALLEL.
+    """
+    def __init__(self, limit: int, max_limit: int):
+        self.limit = limit
+        self.max_limit = max_limit
+        self._active = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    async def update(self, resp: httpx.Response) -> float:
+        """Adjust the limit from a response; returns seconds to back off."""
+        retry_after = 0.0
+        limit = self.limit
+        if resp.status_code in (429, 503):
+            limit = max(1, limit // 2)
+            try:
+                retry_after = float(resp.headers.get('retry-after', 1))
+            except ValueError:
+                retry_after = 1.0
+        else:
+            limit = min(self.max_limit, limit + 1)
+            remaining = resp.headers.get('x-ratelimit-remaining-requests')
+            if remaining and remaining.isdigit():
+                limit = max(1, min(limit, int(remaining)))
+        async with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+        return retry_after
+
 class ParallelCoderAgent:
-    def __init__(self, model="codellama", max_concurrent=3):
+    def __init__(self, model="codellama", max_concurrent=OLLAMA_NUM_PARALLEL,
+                 max_limit=OLLAMA_NUM_PARALLEL, retries=3):
         self.model = model
-        self.semaphore = asyncio.Semaphore(max_concurrent)
-
-    async def code_file(self, entry: FilePlanEntry, all_entries: List[FilePlanEntry], websocket) -> Dict[str, str]:
-        async with self.semaphore:
-            # Build context from imports
-            context = ""
-            for imp in entry.imports:
-                imported = next((e for e in all_entries if e.path == imp), None)
-                if imported and imported.exports:
-                    context += f"\nFrom {imp} you can use:\n"
-                    for exp in imported.exports:
-                        context += f"  {exp.signature}  # {exp.description}\n"
-            system = f"Write complete code for {entry.path}. Purpose: {entry.purpose}\nExports needed: {[e.name for e in entry.exports]}\nContext:\n{context}\nOnly output code, no explanations."
-            response = ollama.generate(model=self.model, prompt=entry.purpose, system=system)
-            content = response.get('response', '')
-            # Stream file to frontend immediately
-            await websocket.send_text(json.dumps({
-                "type": "file", "path": entry.path, "content": content,
-                "stage": "coding", "done": 0, "total": len(all_entries)
-            }))
-            return {entry.path: content}
+        self.limiter = AdaptiveLimiter(max_concurrent, max(max_concurrent, max_limit))
+        self.retries = retries
+
+    async def _generate(self, prompt: str, system: str) -> str:
+        for attempt in range(self.retries + 1):
+            async with self.limiter:
+                resp = await get_ollama().generate_response(self.model, prompt, system)
+                backoff = await self.limiter.update(resp)
+            if not backoff:
+                resp.raise_for_status()
+                return resp.json().get('response', '')
+            if attempt == self.retries:
+                resp.raise_for_status()
+            await asyncio.sleep(backoff)
+        return ''
+
+    def _generated_exports(self, path: str, code: str) -> List[str]:
+        """Top-level class and function signatures of generated code, [] if it can't be parsed."""
+        try:
+            from src.ast.parser import get_ast_parser
+            summary = get_ast_parser().parse_file(path, code)
+        except Exception as e:  # no usable tree-sitter: the plan's exports are used instead
+            logger.debug(f'Could not parse generated {path}: {e}')
+            return []
+        if "error" in summary:
+            return []
+        methods = {id(m) for cls in summary["classes"] for m in cls["methods"]}
+        return ([f"class {cls['name']}" for cls in summary["classes"]] +
+                [f["signature"] or f["name"] for f in summary["functions"] if id(f) not in methods])
+
+    def _context(self, entry: FilePlanEntry, by_path: Dict[str, FilePlanEntry],
+                 generated: Dict[str, List[str]] = None) -> str:
+        context = ""
+        for imp in entry.imports:
+            imported = by_path.get(imp)
+            written = (generated or {}).get(imp)
+            if written:
+                # The dependency is already written: show what it really exports
+                context += f"\nFrom {imp} you can use:\n"
+                for sig in written:
+                    context += f"  {sig}\n"
+            elif imported and imported.exports:
+                context += f"\nFrom {imp} you can use:\n"
+                for exp in imported.exports:
+                    context += f"  {exp.signature}  # {exp.description}\n"
+        return context
+
+    async def code_file(self, entry: FilePlanEntry, all_entries: List[FilePlanEntry], websocket,
+                        progress: Dict[str, int] = None,
+                        generated: Dict[str, List[str]] = None) -> Dict[str, str]:
+        by_path = {e.path: e for e in all_entries}
+        context = self._context(entry, by_path, generated)
+        system = f"Write complete code for {entry.path}. Purpose: {entry.purpose}\nExports needed: {[e.name for e in entry.exports]}\nContext:\n{context}\nOnly output code, no explanations."
+        content = await self._generate(entry.purpose, system)
+        done = 0
+        if progress is not None:
+            progress['done'] += 1
+            done = progress['done']
+        # Stream file to frontend immediately
+        await websocket.send_text(json.dumps({
+            "type": "file", "path": entry.path, "content": content,
+            "stage": "coding", "done": done, "total": len(all_entries)
+        }))
+        return {entry.path: content}
 
     async def generate_all(self, plan: FilePlan, websocket) -> Dict[str, str]:
-        tasks = [self.code_file(entry, plan.files, websocket) for entry in plan.files]
-        results = await asyncio.gather(*tasks)
-        final = {}
-        for r in results:
-            final.update(r)
-        return final
+        final, generated = {}, {}
+        progress = {'done': 0}
+        levels = topological_levels(plan.files)
+        level_of = {e.path: i for i, level in enumerate(levels) for e in level}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(entry: FilePlanEntry, deps: List[asyncio.Task]):
+            if deps:
+                await asyncio.gather(*deps)
+            result = await self.code_file(entry, plan.files, websocket, progress, generated)
+            generated[entry.path] = await asyncio.to_thread(
+                self._generated_exports, entry.path, result[entry.path])
+            final.update(result)
+
+        # Each file starts as soon as the files it imports are written, not
+        # when its whole level is, and is prompted with their real exports.
+        # Files in an import cycle share a level and don't wait for each other.
+        for level in levels:
+            for entry in level:
+                deps = [tasks[p] for p in entry.imports
+                        if p in tasks and level_of[p] < level_of[entry.path]]
+                tasks[entry.path] = asyncio.create_task(run(entry, deps))
+        try:
+            await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+        return {e.path: final[e.path] for e in plan.files if e.path in final}
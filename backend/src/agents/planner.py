@@ -1,4 +1,4 @@
-﻿import ollama
+﻿from src.core.ollama_client import get_ollama
 import json
 
 class Planner:
@@ -11,7 +11,7 @@ Each plan: {"name": "Plan name", "description": "what it does", "estimated_time"
 Output only valid JSON array."""
         
         prompt = f"Requirements: {json.dumps(requirements)}\nGenerate 2 implementation plans."
-        response = ollama.generate(model=self.model, prompt=prompt, system=system)
+        response = await get_ollama().generate(model=self.model, prompt=prompt, system=system)
         try:
             plans = json.loads(response['response'])
             if isinstance(plans, dict) and "plans" in plans:
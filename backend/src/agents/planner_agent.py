@@ -1,6 +1,6 @@
 ﻿# backend/src/agents/planner_agent.py
 import json
-import ollama
+from src.core.ollama_client import get_ollama
 from src.schemas.file_plan import FilePlan, FilePlanEntry
 
 class PlannerAgent:
@@ -15,7 +15,7 @@ The plan must contain a 'files' array. Each file has:
 - exports: list of {name, signature, description, return_type}
 - imports: list of relative paths this file will import
 Output ONLY valid JSON, no extra text. Plan for 20-50 files."""
-        response = ollama.generate(model=self.model, prompt=prompt, system=system)
+        response = await get_ollama().generate(model=self.model, prompt=prompt, system=system)
         try:
             data = json.loads(response['response'])
             return FilePlan(**data)
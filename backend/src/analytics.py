@@ -1,7 +1,12 @@
 ﻿# backend/src/analytics.py
+import os
+import asyncio
 import sqlite3
 import json
 import time
+import queue
+import atexit
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Optional
@@ -10,6 +15,20 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "1.0"))  # seconds
+QUEUE_MAX = int(os.getenv("ANALYTICS_QUEUE_MAX", "100000"))
+# Crash-safety: SQLite synchronous level for the writer (OFF, NORMAL or FULL),
+# and whether log_event waits until its event is committed.
+SYNCHRONOUS = os.getenv("ANALYTICS_SYNCHRONOUS", "NORMAL").upper()
+DURABLE = os.getenv("ANALYTICS_DURABLE", "false").lower() not in ('0', 'false', 'no')
+
+INSERT_SQL = """
+    INSERT INTO events (timestamp, event_type, user_id, tokens_used, accepted,
+                        duration_ms, model, agent_name, language, file_path)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
 class AnalyticsEvent(BaseModel):
     event_type: str  # 'completion', 'agent_run', 'deploy', 'test_run'
     user_id: str = "local"
@@ -33,13 +52,36 @@ class AnalyticsSummary(BaseModel):
     users: List[str]
 
 class AnalyticsLogger:
-    def __init__(self, db_path: str = "./workspace/.analytics/events.db"):
+    """Event log in SQLite, written in batches by a background thread.
+
+    log_event only timestamps the event and queues it. The writer thread
+    keeps one WAL-mode connection and inserts queued rows with executemany,
+    committing every BATCH_SIZE events or FLUSH_INTERVAL seconds. Reads
+    flush first, so they always see logged events. Up to FLUSH_INTERVAL of
+    events can be lost on a crash unless durable is set, which makes
+    log_event wait for its commit; close() (also run at exit) drains the
+    queue. That wait blocks the calling thread, so async code should use
+    alog_event, which runs it in a worker thread.
+    """
+    def __init__(self, db_path: str = "./workspace/.analytics/events.db",
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 synchronous: str = SYNCHRONOUS, durable: bool = DURABLE):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous if synchronous in ('OFF', 'NORMAL', 'FULL') else 'NORMAL'
+        self.durable = durable
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_MAX)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self.dropped = 0
         self._init_db()
 
     def _init_db(self):
         with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS events (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -57,26 +99,112 @@ class AnalyticsLogger:
             """)
             conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON events(timestamp)")
 
+    def _ensure_writer(self):
+        if self._writer is None or not self._writer.is_alive():
+            with self._start_lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._write_loop, name='analytics-writer',
+                                                    daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        try:
+            stop = False
+            while not stop:
+                item = self._queue.get()
+                rows, waiters = [], []
+                deadline = time.monotonic() + self.flush_interval
+                while True:
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        rows.append(item)
+                    # Flush requests and shutdown commit what is queued right away
+                    if stop or waiters or len(rows) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                if rows:
+                    try:
+                        with conn:
+                            conn.executemany(INSERT_SQL, rows)
+                    except sqlite3.Error as e:
+                        logger.error(f'Dropped {len(rows)} analytics events: {e}')
+                for waiter in waiters:
+                    waiter.set()
+        finally:
+            conn.close()
+
     def log_event(self, event: AnalyticsEvent):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                INSERT INTO events (timestamp, event_type, user_id, tokens_used, accepted,
-                                    duration_ms, model, agent_name, language, file_path)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                datetime.utcnow().isoformat(),
-                event.event_type,
-                event.user_id,
-                event.tokens_used,
-                1 if event.accepted else 0,
-                event.duration_ms,
-                event.model,
-                event.agent_name,
-                event.language,
-                event.file_path
-            ))
+        """Queue an event; when durable, block until it is committed."""
+        row = (
+            datetime.utcnow().isoformat(),
+            event.event_type,
+            event.user_id,
+            event.tokens_used,
+            1 if event.accepted else 0,
+            event.duration_ms,
+            event.model,
+            event.agent_name,
+            event.language,
+            event.file_path
+        )
+        if self._closed:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(INSERT_SQL, row)
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f'Analytics queue full, {self.dropped} events dropped so far')
+            return
+        if self.durable:
+            self.flush()
+
+    async def alog_event(self, event: AnalyticsEvent):
+        """log_event for async code: the durable commit wait runs off the event loop."""
+        if self.durable:
+            await asyncio.to_thread(self.log_event, event)
+        else:
+            self.log_event(event)
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until every event queued so far is committed; False on timeout."""
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(deadline - time.monotonic(), 0))
+
+    def close(self, timeout: float = 10.0):
+        """Commit queued events and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._writer is not None and self._writer.is_alive():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning('Analytics queue still full at close, pending events may be lost')
+                return
+            self._writer.join(timeout)
 
     def get_summary(self, days: int = 7) -> AnalyticsSummary:
+        self.flush()
         start_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.execute("""
@@ -126,6 +254,7 @@ class AnalyticsLogger:
         )
 
     def export_csv(self, days: int = 30) -> str:
+        self.flush()
         start_date = (datetime.utcnow() - timedelta(days=days)).isoformat()
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.execute("""
@@ -147,4 +276,10 @@ def get_analytics():
     global _analytics
     if _analytics is None:
         _analytics = AnalyticsLogger()
+        atexit.register(_analytics.close)
     return _analytics
+
+def close_analytics():
+    """Flush and stop the shared logger, if it was ever created."""
+    if _analytics is not None:
+        _analytics.close()
@@ -0,0 +1,27 @@
+# backend/src/api/ast_routes.py
+import json
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from src.ast.symbol_index import get_symbol_index
+
+router = APIRouter(prefix="/api/ast", tags=["ast"])
+
+@router.post("/index")
+async def index_workspace(stream: bool = False, workspace: str = "./workspace"):
+    idx = get_symbol_index(workspace)
+    if stream:
+        # Sync generator: Starlette iterates it in a worker thread
+        return StreamingResponse((json.dumps(event) + "\n" for event in idx.index()),
+                                 media_type="application/x-ndjson")
+    import asyncio
+    return await asyncio.to_thread(idx.sync)
+
+@router.get("/symbols")
+async def find_symbol(name: str, limit: int = 50, workspace: str = "./workspace"):
+    import asyncio
+    return await asyncio.to_thread(get_symbol_index(workspace).find, name, limit)
+
+@router.get("/file")
+async def file_symbols(path: str, workspace: str = "./workspace"):
+    import asyncio
+    return await asyncio.to_thread(get_symbol_index(workspace).file_symbols, path) or {"error": "not indexed"}
@@ -17,12 +17,11 @@ def get_query():
 @router.post("/build")
 async def build_graph(background_tasks: BackgroundTasks):
     def train():
+        global _gnn_query
         trainer = GNNTrainer()
-        embeddings = trainer.train(epochs=50)
-        # Save embeddings to file for later use
-        import pickle
-        with open("./backend/models/gnn_embeddings.pkl", "wb") as f:
-            pickle.dump(embeddings, f)
+        # Embeddings are written to the versioned store that GNNQuery loads
+        trainer.train(epochs=50)
+        _gnn_query = None
         print("GNN training complete")
     background_tasks.add_task(train)
     return {"status": "training_started", "message": "Model training in background. Check logs."}
@@ -33,6 +32,11 @@ async def get_related(file: str, top_k: int = 5):
     results = query.get_related_files(file, top_k)
     return {"file": file, "related": results}
 
+@router.post("/related_batch")
+async def get_related_batch(body: dict):
+    query = get_query()
+    return {"related": query.get_related_files_batch(body["files"], body.get("top_k", 5))}
+
 @router.get("/status")
 async def graph_status():
     model_exists = os.path.exists("./backend/models/gnn_model.pt")
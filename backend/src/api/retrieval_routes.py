@@ -5,8 +5,16 @@ from src.retrieval.bm25_index import get_bm25
 router = APIRouter(prefix="/api/retrieval", tags=["retrieval"])
 
 @router.post("/rebuild_bm25")
-async def rebuild_bm25():
-    from src.retrieval.bm25_index import BM25Index
-    # Force rebuild
-    idx = BM25Index()
-    return {"status": "rebuilt"}
+async def rebuild_bm25(full: bool = False):
+    import asyncio
+    idx = await asyncio.to_thread(get_bm25)  # the first call builds the index
+    # Incremental by default: only files whose mtime changed are re-indexed
+    stats = await asyncio.to_thread(idx.rebuild if full else idx.sync)
+    return {"status": "rebuilt", **stats}
+
+@router.post("/search")
+async def hybrid_search(body: dict):
+    import dataclasses
+    from src.retrieval.hybrid_rag import get_retriever
+    chunks = await get_retriever().retrieve(body["query"], body.get("current_file"), body.get("top_k", 8))
+    return [dataclasses.asdict(c) for c in chunks]
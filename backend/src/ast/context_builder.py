@@ -1,12 +1,86 @@
-﻿# backend/src/ast/context_builder.py (stub)
-from typing import Dict
+﻿# backend/src/ast/context_builder.py
+import hashlib
+from pathlib import Path
+from typing import Dict, List, Optional
+from src.ast.symbol_index import get_symbol_index
+
+MAX_CONTEXT_CHARS = 12000
 
 class ContextBuilder:
+    """Outlines of workspace files (imports, classes, methods, functions) for agent prompts.
+
+    Outlines come from the persisted symbol table; a file whose content no
+    longer matches its stored hash is parsed on the spot instead.
+    """
     def __init__(self, workspace_path: str = "./workspace"):
-        pass
+        self.workspace_path = Path(workspace_path)
+        self.index = get_symbol_index(workspace_path)
+
+    def _rel(self, path: str) -> str:
+        p = Path(path)
+        if p.is_absolute():
+            try:
+                p = p.relative_to(self.workspace_path.resolve())
+            except ValueError:
+                return p.as_posix()
+        return p.as_posix()
+
+    def _symbols(self, rel: str, content: str) -> Optional[Dict]:
+        stored = self.index.file_symbols(rel)
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        if stored and stored["hash"] == digest:
+            return stored
+        from src.ast.parser import get_ast_parser
+        summary = get_ast_parser().parse_file(rel, content)
+        if "error" in summary:
+            return None
+        symbols = []
+        methods = set()
+        for cls in summary["classes"]:
+            symbols.append({"kind": "class", "name": cls["name"], "parent": None, "signature": None,
+                            "start_line": cls["start_line"], "end_line": cls["end_line"]})
+            for m in cls["methods"]:
+                methods.add(id(m))
+                symbols.append({"kind": "method", "name": m["name"], "parent": cls["name"],
+                                "signature": m["signature"], "start_line": m["start_line"],
+                                "end_line": m["end_line"]})
+        symbols += [{"kind": "function", "name": f["name"], "parent": None, "signature": f["signature"],
+                     "start_line": f["start_line"], "end_line": f["end_line"]}
+                    for f in summary["functions"] if id(f) not in methods]
+        symbols.sort(key=lambda s: s["start_line"])
+        return {"symbols": symbols, "imports": summary["imports"], "exports": summary["exports"]}
+
+    def _outline(self, rel: str, info: Dict) -> str:
+        lines = [f"# {rel}"]
+        modules = [imp["module"] for imp in info["imports"] if imp.get("module")]
+        if modules:
+            lines.append(f"imports: {', '.join(dict.fromkeys(modules))}")
+        for s in info["symbols"]:
+            span = f"L{s['start_line']}-{s['end_line']}"
+            if s["kind"] == "class":
+                lines.append(f"class {s['name']} ({span})")
+            else:
+                indent = "  " if s["kind"] == "method" else ""
+                lines.append(f"{indent}def {s['signature'] or s['name']} ({span})")
+        return "\n".join(lines)
 
-    def build_agent_context(self, files: Dict[str, str]) -> str:
-        return ""
+    def build_agent_context(self, files: Dict[str, str], max_chars: int = MAX_CONTEXT_CHARS) -> str:
+        parts: List[str] = []
+        used = 0
+        for path, content in files.items():
+            rel = self._rel(path)
+            info = self._symbols(rel, content)
+            if not info or not (info["symbols"] or info["imports"]):
+                continue
+            outline = self._outline(rel, info)
+            if used + len(outline) > max_chars:
+                continue
+            parts.append(outline)
+            used += len(outline)
+        return "\n\n".join(parts)
 
     def inject_into_prompt(self, user_prompt: str, workspace_files: Dict[str, str]) -> str:
-        return user_prompt
+        context = self.build_agent_context(workspace_files)
+        if not context:
+            return user_prompt
+        return f"Existing code structure:\n{context}\n\n{user_prompt}"
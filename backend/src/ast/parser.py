@@ -4,13 +4,55 @@ from tree_sitter import Language, Parser
 import tree_sitter_python as tspython
 import tree_sitter_javascript as tsjavascript
 import tree_sitter_typescript as tstypescript
+import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+
+# Files whose last tree is kept for incremental reparsing
+PARSE_CACHE_SIZE = int(os.getenv("AST_PARSE_CACHE_SIZE", "256"))
+
+def _common_prefix(a: bytes, b: bytes, limit: int) -> int:
+    """Length of the common prefix of a and b, capped at limit (binary search on C-level compares)."""
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _point(src: bytes, offset: int) -> Tuple[int, int]:
+    return src.count(b"\n", 0, offset), offset - (src.rfind(b"\n", 0, offset) + 1)
 
 class ASTParser:
-    def __init__(self):
+    """Summarises source files with tree-sitter.
+
+    The last tree of each recently parsed file is kept in an LRU cache. When
+    the same path is parsed again, the old tree is edited to match the new
+    source and reparsed incrementally, and only top-level nodes touching the
+    changed ranges are re-summarised; the others reuse their previous summary
+    with line numbers shifted.
+    """
+    def __init__(self, cache_size: int = PARSE_CACHE_SIZE):
         # Setup parsers for different languages
         self.parsers = {}
+        self.cache_size = cache_size
+        # path -> (lang, source bytes, tree, [(type, start_byte, end_byte, summary)])
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()  # tree-sitter parsers are not thread-safe
         self._init_parser("python", tspython.language())
         self._init_parser("javascript", tsjavascript.language())
         self._init_parser("typescript", tstypescript.language_typescript())
@@ -41,100 +83,207 @@ class ASTParser:
         if not lang or lang not in self.parsers:
             return {"error": f"Unsupported language: {lang}"}
         parser = self.parsers[lang]
-        tree = parser.parse(bytes(code, "utf-8"))
-        root = tree.root_node
-        functions = self._extract_functions(root, code)
-        classes = self._extract_classes(root, code)
-        imports = self._extract_imports(root, code, lang)
-        exports = self._extract_exports(root, code, lang)
-        return {
-            "functions": functions,
-            "classes": classes,
-            "imports": imports,
-            "exports": exports
-        }
+        src = bytes(code, "utf-8")
+        with self._lock:
+            cached = self._cache.pop(filepath, None)
+            if cached and cached[0] == lang:
+                if cached[1] == src:
+                    parts = cached[3]
+                    tree = cached[2]
+                else:
+                    tree, parts = self._reparse(parser, cached, src, lang)
+            else:
+                tree = parser.parse(src)
+                parts = [self._part(child, src, lang) for child in tree.root_node.children]
+            if self.cache_size > 0:
+                self._cache[filepath] = (lang, src, tree, parts)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        summary = {"functions": [], "classes": [], "imports": [], "exports": []}
+        for part in parts:
+            for key, items in part[3].items():
+                summary[key].extend(items)
+        return summary
+
+    def invalidate(self, filepath: str = None):
+        """Drop the cached tree for a file, or for all files."""
+        with self._lock:
+            if filepath is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(filepath, None)
+
+    def _part(self, node, src: bytes, lang: str) -> tuple:
+        return (node.type, node.start_byte, node.end_byte, self._collect(node, src, lang))
+
+    def _reparse(self, parser, cached: tuple, src: bytes, lang: str):
+        _, old_src, old_tree, old_parts = cached
+        limit = min(len(old_src), len(src))
+        start = _common_prefix(old_src, src, limit)
+        suffix = _common_suffix(old_src, src, limit - start)
+        old_end, new_end = len(old_src) - suffix, len(src) - suffix
+        start_point = _point(src, start)
+        old_end_point = _point(old_src, old_end)
+        new_end_point = _point(src, new_end)
+        old_tree.edit(start_byte=start, old_end_byte=old_end, new_end_byte=new_end,
+                      start_point=start_point, old_end_point=old_end_point,
+                      new_end_point=new_end_point)
+        tree = parser.parse(src, old_tree)
+        dirty = [(r.start_byte, r.end_byte) for r in old_tree.changed_ranges(tree)]
+        dirty.append((start, new_end))
+        byte_delta = new_end - old_end
+        row_delta = new_end_point[0] - old_end_point[0]
+        previous = {(t, b, e): summary for t, b, e, summary in old_parts}
+        parts = []
+        for child in tree.root_node.children:
+            b, e = child.start_byte, child.end_byte
+            summary = None
+            if not any(b <= hi and e >= lo for lo, hi in dirty):
+                if e <= start:
+                    summary = previous.get((child.type, b, e))
+                elif b >= new_end:
+                    summary = previous.get((child.type, b - byte_delta, e - byte_delta))
+                    if summary is not None and row_delta:
+                        summary = self._shift(summary, row_delta)
+            if summary is None:
+                summary = self._collect(child, src, lang)
+            parts.append((child.type, b, e, summary))
+        return tree, parts
+
+    def _shift(self, summary: Dict, rows: int) -> Dict:
+        """Copy of a summary with every line span moved by rows."""
+        moved = {}
+        def shift(item):
+            if id(item) not in moved:
+                moved[id(item)] = {**item, "start_line": item["start_line"] + rows,
+                                   "end_line": item["end_line"] + rows}
+            return moved[id(item)]
+        functions = [shift(f) for f in summary["functions"]]
+        classes = []
+        for cls in summary["classes"]:
+            cls = shift(cls)
+            cls["methods"] = [shift(m) for m in cls["methods"]]
+            classes.append(cls)
+        return {"functions": functions, "classes": classes,
+                "imports": summary["imports"], "exports": summary["exports"]}
 
-    def _extract_functions(self, node, code: str) -> List[Dict]:
-        functions = []
-        if node.type == "function_definition" or node.type == "function_declaration":
-            name_node = self._get_child_by_field(node, "name")
-            if name_node:
-                name = code[name_node.start_byte:name_node.end_byte]
-                params_node = self._get_child_by_field(node, "parameters")
-                params = code[params_node.start_byte:params_node.end_byte] if params_node else "()"
-                return_type = self._get_return_type(node, code)
-                docstring = self._get_docstring(node, code)
-                functions.append({
-                    "name": name,
-                    "signature": f"{name}{params} -> {return_type}" if return_type else f"{name}{params}",
-                    "return_type": return_type,
-                    "docstring": docstring,
+    def _collect(self, node, src: bytes, lang: str) -> Dict:
+        """Gather functions, classes, imports and exports under node in one pre-order walk.
+
+        Uses a TreeCursor instead of recursion, so deeply nested code can't hit
+        the recursion limit. A function is added to the methods of every class
+        it is nested in, as well as to the top-level function list.
+        """
+        functions, classes, imports, exports = [], [], [], []
+        open_classes = []  # (depth, class dict) for classes enclosing the cursor
+        cursor = node.walk()
+        depth = 0
+        while True:
+            node = cursor.node
+            while open_classes and open_classes[-1][0] >= depth:
+                open_classes.pop()
+            kind = node.type
+            if kind == "function_definition" or kind == "function_declaration":
+                func = self._function_info(node, src)
+                if func:
+                    functions.append(func)
+                    for _, cls in open_classes:
+                        cls["methods"].append(func)
+            elif kind == "class_definition":
+                name_node = self._get_child_by_field(node, "name")
+                cls = {
+                    "name": self._text(name_node, src) if name_node else "Unknown",
+                    "methods": [],
+                    "base_classes": [],
                     "start_line": node.start_point[0] + 1,
                     "end_line": node.end_point[0] + 1
-                })
-        for child in node.children:
-            functions.extend(self._extract_functions(child, code))
-        return functions
+                }
+                classes.append(cls)
+                open_classes.append((depth, cls))
+            else:
+                imp = self._import_info(node, src, lang)
+                if imp:
+                    imports.append(imp)
+            exports.extend(self._export_names(node, src, lang))
+            if cursor.goto_first_child():
+                depth += 1
+                continue
+            while not cursor.goto_next_sibling():
+                if not cursor.goto_parent():
+                    return {
+                        "functions": functions,
+                        "classes": classes,
+                        "imports": imports,
+                        "exports": exports
+                    }
+                depth -= 1
 
-    def _extract_classes(self, node, code: str) -> List[Dict]:
-        classes = []
-        if node.type == "class_definition":
-            name_node = self._get_child_by_field(node, "name")
-            name = code[name_node.start_byte:name_node.end_byte] if name_node else "Unknown"
-            methods = self._extract_functions(node, code)  # methods inside class
-            base_classes = []
-            classes.append({
-                "name": name,
-                "methods": methods,
-                "base_classes": base_classes
-            })
-        for child in node.children:
-            classes.extend(self._extract_classes(child, code))
-        return classes
+    def _text(self, node, src: bytes) -> str:
+        return src[node.start_byte:node.end_byte].decode("utf-8", errors="replace")
 
-    def _extract_imports(self, node, code: str, lang: str) -> List[Dict]:
-        imports = []
+    def _function_info(self, node, src: bytes) -> Optional[Dict]:
+        name_node = self._get_child_by_field(node, "name")
+        if not name_node:
+            return None
+        name = self._text(name_node, src)
+        params_node = self._get_child_by_field(node, "parameters")
+        params = self._text(params_node, src) if params_node else "()"
+        return_type = self._get_return_type(node, src)
+        docstring = self._get_docstring(node, src)
+        return {
+            "name": name,
+            "signature": f"{name}{params} -> {return_type}" if return_type else f"{name}{params}",
+            "return_type": return_type,
+            "docstring": docstring,
+            "start_line": node.start_point[0] + 1,
+            "end_line": node.end_point[0] + 1
+        }
+
+    def _import_info(self, node, src: bytes, lang: str) -> Optional[Dict]:
         if lang == "python":
             if node.type == "import_statement":
                 # e.g., import os
-                names = []
-                for child in node.children:
-                    if child.type == "dotted_name":
-                        names.append(code[child.start_byte:child.end_byte])
+                names = [self._text(child, src) for child in node.children if child.type == "dotted_name"]
                 if names:
-                    imports.append({"module": names[0], "names": names[1:], "alias": None})
+                    return {"module": names[0], "names": names[1:], "alias": None}
             elif node.type == "import_from_statement":
                 module_node = self._get_child_by_field(node, "module_name")
-                module = code[module_node.start_byte:module_node.end_byte] if module_node else ""
-                name_nodes = self._get_children_by_field(node, "name")
-                names = [code[n.start_byte:n.end_byte] for n in name_nodes]
-                imports.append({"module": module, "names": names, "alias": None})
+                module = self._text(module_node, src) if module_node else ""
+                names = [self._text(n, src) for n in self._get_children_by_field(node, "name")]
+                return {"module": module, "names": names, "alias": None}
         else:  # JavaScript/TypeScript
             if node.type == "import_statement":
                 source_node = self._get_child_by_field(node, "source")
-                source = code[source_node.start_byte:source_node.end_byte] if source_node else ""
-                imports.append({"module": source.strip('"\'')})
-        for child in node.children:
-            imports.extend(self._extract_imports(child, code, lang))
-        return imports
+                source = self._text(source_node, src) if source_node else ""
+                return {"module": source.strip('"\'')}
+            elif node.type == "export_statement":
+                # Re-exports: export { x } from './y' / export * from './y'
+                source_node = self._get_child_by_field(node, "source")
+                if source_node:
+                    return {"module": self._text(source_node, src).strip('"\'')}
+            elif node.type == "call_expression":
+                # require('x') and dynamic import('x') with a literal specifier
+                callee = self._get_child_by_field(node, "function")
+                if callee is None or not (callee.type == "import" or
+                                          (callee.type == "identifier" and self._text(callee, src) == "require")):
+                    return None
+                args = self._get_child_by_field(node, "arguments")
+                first = next((c for c in args.children if c.is_named), None) if args else None
+                if first is not None and first.type == "string":
+                    return {"module": self._text(first, src).strip('"\'')}
+        return None
 
-    def _extract_exports(self, node, code: str, lang: str) -> List[str]:
-        exports = []
+    def _export_names(self, node, src: bytes, lang: str) -> List[str]:
         if lang == "python":
             if node.type == "expression_statement" and node.children:
                 first = node.children[0]
                 if first.type == "assignment" and first.children and first.children[0].type == "identifier":
-                    name = code[first.children[0].start_byte:first.children[0].end_byte]
-                    exports.append(name)
+                    return [self._text(first.children[0], src)]
         else:  # JavaScript/TypeScript
             if node.type == "export_statement":
                 # Simplified: look for "export default ..." etc.
-                for child in node.children:
-                    if child.type == "identifier":
-                        exports.append(code[child.start_byte:child.end_byte])
-        for child in node.children:
-            exports.extend(self._extract_exports(child, code, lang))
-        return exports
+                return [self._text(child, src) for child in node.children if child.type == "identifier"]
+        return []
 
     def _get_child_by_field(self, node, field: str):
         for child in node.children:
@@ -145,18 +294,18 @@ class ASTParser:
     def _get_children_by_field(self, node, field: str):
         return [child for child in node.children if child.field_name == field]
 
-    def _get_return_type(self, node, code: str) -> Optional[str]:
+    def _get_return_type(self, node, src: bytes) -> Optional[str]:
         # Simple heuristic: look for "->" in Python
         for child in node.children:
             if child.type == "type":
-                return code[child.start_byte:child.end_byte]
+                return self._text(child, src)
         return None
 
-    def _get_docstring(self, node, code: str) -> Optional[str]:
+    def _get_docstring(self, node, src: bytes) -> Optional[str]:
         # Look for string literal as first child
         for child in node.children:
             if child.type == "string" or child.type == "expression_statement":
-                return code[child.start_byte:child.end_byte]
+                return self._text(child, src)
         return None
 
 # Singleton instance
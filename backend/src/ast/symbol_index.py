@@ -0,0 +1,274 @@
+﻿# backend/src/ast/symbol_index.py
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from src.system.fs_walk import walk_files
+
+logger = logging.getLogger('symbol_index')
+
+PARSED_SUFFIXES = {".py", ".js", ".mjs", ".cjs", ".jsx", ".ts", ".tsx"}
+# Below this many changed files the process pool's startup costs more than it saves.
+PARALLEL_MIN_FILES = 64
+WRITE_BATCH = 200  # parsed files per SQLite transaction
+# Bump when the stored summary shape changes so existing tables are rebuilt.
+INDEX_VERSION = 1
+
+def _summarize(job: tuple) -> dict:
+    """Hash and parse one file; the summary is skipped if the hash is unchanged.
+
+    Module-level so it can run in ProcessPoolExecutor workers, each of which
+    builds its own ASTParser.
+    """
+    rel, full_path, known_hash = job
+    try:
+        with open(full_path, "rb") as f:
+            data = f.read()
+        st = os.stat(full_path)
+    except OSError as e:
+        return {"path": rel, "error": str(e)}
+    digest = hashlib.sha1(data).hexdigest()
+    result = {"path": rel, "hash": digest, "mtime": st.st_mtime_ns, "size": st.st_size}
+    if digest == known_hash:
+        return result
+    from src.ast.parser import get_ast_parser
+    try:
+        summary = get_ast_parser().parse_file(full_path, data.decode("utf-8", errors="replace"))
+    except Exception as e:
+        return {**result, "error": str(e)}
+    if "error" in summary:
+        return {**result, "error": summary["error"]}
+    result["summary"] = summary
+    return result
+
+class SymbolIndex:
+    """Workspace-wide ASTParser output persisted in SQLite.
+
+    Each file's functions, classes (with methods), imports and exports are
+    stored with their line spans and the file's content hash. index() stats
+    every file and only hashes the ones whose mtime or size moved, and only
+    re-parses the ones whose hash changed, fanning that work out over a
+    process pool when there is enough of it.
+    """
+    def __init__(self, workspace_path: str = "./workspace", index_path: str = "./backend/.symbol_index.db"):
+        self.workspace_path = Path(workspace_path)
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._init_db()
+
+    def _init_db(self):
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    error TEXT
+                );
+                CREATE TABLE IF NOT EXISTS symbols (
+                    path TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    parent TEXT,
+                    signature TEXT,
+                    docstring TEXT,
+                    start_line INTEGER NOT NULL,
+                    end_line INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_symbols_path ON symbols(path);
+                CREATE INDEX IF NOT EXISTS idx_symbols_name ON symbols(name);
+                CREATE TABLE IF NOT EXISTS imports (
+                    path TEXT NOT NULL,
+                    module TEXT NOT NULL,
+                    names TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_imports_path ON imports(path);
+                CREATE INDEX IF NOT EXISTS idx_imports_module ON imports(module);
+                CREATE TABLE IF NOT EXISTS exports (
+                    path TEXT NOT NULL,
+                    name TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_exports_path ON exports(path);
+            """)
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                self._conn.executescript(
+                    "DROP TABLE exports; DROP TABLE imports; DROP TABLE symbols; DROP TABLE files;")
+                self._conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+                self._init_db()
+
+    def _walk(self):
+        for entry in walk_files(self.workspace_path, suffixes=PARSED_SUFFIXES):
+            yield Path(os.path.relpath(entry.path, self.workspace_path)).as_posix(), entry
+
+    def index(self, workers: int = None) -> Iterator[dict]:
+        """Bring the table in line with the workspace, yielding one event per re-indexed file.
+
+        Events are {"path", "status"} with status "indexed", "unchanged"
+        (touched but same content), "error" or "removed"; the last event is
+        {"status": "done", ...counts}.
+        """
+        with self._lock:
+            known = {row[0]: row[1:] for row in
+                     self._conn.execute("SELECT path, hash, mtime, size FROM files")}
+        jobs, seen = [], set()
+        for rel, entry in self._walk():
+            seen.add(rel)
+            state = known.get(rel)
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if state and state[1] == st.st_mtime_ns and state[2] == st.st_size:
+                continue
+            jobs.append((rel, entry.path, state[0] if state else None))
+        counts = {"indexed": 0, "unchanged": 0, "error": 0, "removed": 0}
+        removed = [rel for rel in known if rel not in seen]
+        if removed:
+            with self._lock, self._conn:
+                for rel in removed:
+                    self._drop(rel)
+            for rel in removed:
+                counts["removed"] += 1
+                yield {"path": rel, "status": "removed"}
+        pending = []
+        for result in self._run(jobs, workers):
+            pending.append(result)
+            if len(pending) >= WRITE_BATCH:
+                self._write(pending)
+                pending.clear()
+            status = "error" if "error" in result else "indexed" if "summary" in result else "unchanged"
+            counts[status] += 1
+            yield {"path": result["path"], "status": status}
+        self._write(pending)
+        yield {"status": "done", "files": len(seen), **counts}
+
+    def sync(self, workers: int = None) -> dict:
+        """index() without the per-file events."""
+        done = {}
+        for done in self.index(workers):
+            pass
+        return done
+
+    def _run(self, jobs: List[tuple], workers: int = None) -> Iterator[dict]:
+        if len(jobs) < PARALLEL_MIN_FILES:
+            for job in jobs:
+                yield _summarize(job)
+            return
+        workers = workers or os.cpu_count() or 1
+        try:
+            # Spawned, not forked: a forked worker could inherit the ASTParser
+            # lock held by another thread (e.g. the graph build) and hang.
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, RuntimeError) as e:
+            logger.warning(f'Process pool unavailable, indexing serially: {e}')
+            yield from (_summarize(job) for job in jobs)
+            return
+        with pool:
+            # Results arrive in submission order as soon as each chunk is done.
+            chunksize = max(1, min(64, len(jobs) // (4 * workers)))
+            yield from pool.map(_summarize, jobs, chunksize=chunksize)
+
+    def _drop(self, rel: str):
+        for table in ("symbols", "imports", "exports", "files"):
+            self._conn.execute(f"DELETE FROM {table} WHERE path = ?", (rel,))
+
+    def _write(self, results: List[dict]):
+        if not results:
+            return
+        symbols, imports, exports = [], [], []
+        with self._lock, self._conn:
+            for r in results:
+                if "hash" not in r:  # unreadable: drop and retry next run
+                    self._drop(r["path"])
+                    continue
+                rel = r["path"]
+                if "summary" not in r and "error" not in r:
+                    self._conn.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?",
+                                       (r["mtime"], r["size"], rel))
+                    continue
+                self._drop(rel)
+                self._conn.execute(
+                    "INSERT INTO files (path, hash, mtime, size, error) VALUES (?, ?, ?, ?, ?)",
+                    (rel, r["hash"], r["mtime"], r["size"], r.get("error")))
+                summary = r.get("summary")
+                if not summary:
+                    continue
+                for cls in summary["classes"]:
+                    symbols.append((rel, "class", cls["name"], None, None, None,
+                                    cls["start_line"], cls["end_line"]))
+                    for m in cls["methods"]:
+                        symbols.append((rel, "method", m["name"], cls["name"], m["signature"],
+                                        m.get("docstring"), m["start_line"], m["end_line"]))
+                methods = {id(m) for cls in summary["classes"] for m in cls["methods"]}
+                for f in summary["functions"]:
+                    if id(f) not in methods:
+                        symbols.append((rel, "function", f["name"], None, f["signature"],
+                                        f.get("docstring"), f["start_line"], f["end_line"]))
+                for imp in summary["imports"]:
+                    imports.append((rel, imp["module"], json.dumps(imp.get("names", []))))
+                exports.extend((rel, name) for name in summary["exports"])
+            self._conn.executemany(
+                "INSERT INTO symbols (path, kind, name, parent, signature, docstring, start_line, end_line) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", symbols)
+            self._conn.executemany("INSERT INTO imports (path, module, names) VALUES (?, ?, ?)", imports)
+            self._conn.executemany("INSERT INTO exports (path, name) VALUES (?, ?)", exports)
+
+    def file_symbols(self, rel: str) -> Optional[Dict]:
+        """Stored summary of one file, or None if it isn't indexed."""
+        with self._lock:
+            row = self._conn.execute("SELECT hash, error FROM files WHERE path = ?", (rel,)).fetchone()
+            if row is None:
+                return None
+            symbols = self._conn.execute(
+                "SELECT kind, name, parent, signature, docstring, start_line, end_line FROM symbols "
+                "WHERE path = ? ORDER BY start_line, rowid", (rel,)).fetchall()
+            imports = self._conn.execute(
+                "SELECT module, names FROM imports WHERE path = ? ORDER BY rowid", (rel,)).fetchall()
+            exports = [r[0] for r in self._conn.execute(
+                "SELECT name FROM exports WHERE path = ? ORDER BY rowid", (rel,))]
+        keys = ("kind", "name", "parent", "signature", "docstring", "start_line", "end_line")
+        return {
+            "path": rel,
+            "hash": row[0],
+            "error": row[1],
+            "symbols": [dict(zip(keys, s)) for s in symbols],
+            "imports": [{"module": m, "names": json.loads(n)} for m, n in imports],
+            "exports": exports,
+        }
+
+    def find(self, name: str, limit: int = 50) -> List[Dict]:
+        """Definitions with the given name across the workspace."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, kind, parent, signature, start_line, end_line FROM symbols "
+                "WHERE name = ? LIMIT ?", (name, limit)).fetchall()
+        keys = ("path", "kind", "parent", "signature", "start_line", "end_line")
+        return [{"name": name, **dict(zip(keys, r))} for r in rows]
+
+# One index per workspace; the default workspace keeps the original db path
+DEFAULT_WORKSPACE = "./workspace"
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+def get_symbol_index(workspace_path: str = DEFAULT_WORKSPACE) -> SymbolIndex:
+    key = os.path.abspath(workspace_path)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            if key == os.path.abspath(DEFAULT_WORKSPACE):
+                index = SymbolIndex(workspace_path)
+            else:
+                digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+                index = SymbolIndex(key, f"./backend/.symbol_index/{digest}.db")
+            _indexes[key] = index
+        return index
@@ -4,7 +4,7 @@ import os
 from typing import Dict, List, Optional
 from enum import Enum
 from pydantic import BaseModel
-import ollama
+from src.core.ollama_client import get_ollama
 
 class ComplianceStandard(str, Enum):
     HIPAA = "hipaa"
@@ -33,14 +33,14 @@ class ComplianceGenerator:
         system = standards_prompts.get(standard, "Generate secure, compliant code.")
         system += " Output only the code, no explanations."
         full_prompt = f"Compliance standard: {standard.value.upper()}\nContext: {context}\nRequirement: {prompt}"
-        response = ollama.generate(model=self.model, prompt=full_prompt, system=system)
+        response = await get_ollama().generate(model=self.model, prompt=full_prompt, system=system)
         return {"code": response['response'], "standard": standard.value}
 
     async def check_compliance(self, code: str, standard: ComplianceStandard) -> ComplianceCheck:
         """Analyze existing code for compliance violations."""
         system = f"You are a compliance auditor. Review the code for {standard.value.upper()} compliance. Output a JSON with: passed (bool), violations (list of strings), recommendations (list of strings). Only JSON, no extra text."
         user_prompt = f"Code:\n{code}\n\nCompliance issues JSON:"
-        response = ollama.generate(model=self.model, prompt=user_prompt, system=system)
+        response = await get_ollama().generate(model=self.model, prompt=user_prompt, system=system)
         try:
             data = json.loads(response['response'])
             return ComplianceCheck(**data)
@@ -0,0 +1,142 @@
+# backend/src/core/generation_cache.py
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger('generation_cache')
+
+CACHE_ENABLED = os.getenv('GENERATION_CACHE', 'true').lower() not in ('0', 'false', 'no')
+CACHE_PATH = os.getenv('GENERATION_CACHE_PATH', './workspace/.cache/generations.db')
+CACHE_TTL = float(os.getenv('GENERATION_CACHE_TTL', str(7 * 24 * 3600)))
+CACHE_MAX_MB = float(os.getenv('GENERATION_CACHE_MAX_MB', '256'))
+
+def normalize_prompt(prompt: str) -> str:
+    return ' '.join(prompt.split()).lower()
+
+def cache_key(prompt: str, language: str, system: str, extra_context: str = None,
+              project: str = None) -> str:
+    h = hashlib.sha256()
+    for part in (normalize_prompt(prompt), language, system, extra_context or '', project or ''):
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+class GenerationCache:
+    """Content-addressed store of parsed generations, keyed by cache_key().
+
+    Each entry is the {path: content} map of one generation, stored as a
+    zlib-compressed JSON blob in SQLite. Entries expire after CACHE_TTL
+    seconds, and the least recently used ones are evicted once the stored
+    blobs exceed CACHE_MAX_MB.
+    """
+    def __init__(self, db_path: str = CACHE_PATH, ttl: float = CACHE_TTL,
+                 max_bytes: int = int(CACHE_MAX_MB * 1024 * 1024)):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS generations (
+                    key TEXT PRIMARY KEY,
+                    language TEXT,
+                    blob BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON generations(accessed)")
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT blob, created FROM generations WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE generations SET accessed = ? WHERE key = ?", (now, key))
+        try:
+            files = json.loads(zlib.decompress(row[0]))
+        except (zlib.error, ValueError) as e:
+            logger.warning(f'Dropping corrupt cache entry {key[:12]}: {e}')
+            self.delete(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return files
+
+    def put(self, key: str, files: Dict[str, str], language: str = '') -> None:
+        if not files:
+            return
+        blob = zlib.compress(json.dumps(files).encode('utf-8'), 6)
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO generations (key, language, blob, size, created, accessed)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, language, blob, len(blob), now, now))
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM generations WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute(
+                "SELECT key, size FROM generations ORDER BY accessed").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+            total -= size
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM generations")
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            entries, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations").fetchone()
+        return {
+            'enabled': CACHE_ENABLED,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+# Singleton instance
+_cache = None
+def get_generation_cache() -> GenerationCache:
+    global _cache
+    if _cache is None:
+        _cache = GenerationCache()
+    return _cache
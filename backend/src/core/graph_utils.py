@@ -1,7 +1,22 @@
-﻿from src.core.graph_query import GraphQuery
+﻿import os
+from src.core.graph_query import GraphQuery
 _current_graph = None
+# The project the user has open; its graph is the current one and
+# generation retrieves context from it
+_project_root = None
+def set_project_root(path):
+    global _project_root
+    _project_root = path
+def get_project_root():
+    return _project_root
+def is_active_workspace(path):
+    """True for the open project, or for any workspace while none is open."""
+    return _project_root is None or os.path.abspath(path) == os.path.abspath(_project_root)
 def set_current_graph(graph):
     global _current_graph
     _current_graph = graph
 def get_current_graph():
     return _current_graph
+def get_graph_query():
+    graph = get_current_graph()
+    return GraphQuery(graph) if graph is not None else None
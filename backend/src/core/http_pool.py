@@ -0,0 +1,91 @@
+﻿# backend/src/core/http_pool.py
+import os
+import logging
+import httpx
+from typing import Dict
+
+logger = logging.getLogger('http_pool')
+
+# Max open connections per provider; override with e.g. GEMINI_MAX_CONNECTIONS=40
+PROVIDER_LIMITS = {
+    'gemini': 20,
+    'groq': 20,
+    'deepseek': 10,
+    'ollama': 8,
+}
+DEFAULT_LIMIT = 10
+DEFAULT_TIMEOUT = 300.0
+KEEPALIVE_EXPIRY = 60.0
+
+class ProviderClients:
+    """Process-wide registry of pooled httpx clients, one per provider.
+
+    Clients keep connections alive between requests and negotiate HTTP/2
+    where the provider supports it, so concurrent generations share a few
+    multiplexed connections instead of paying a TCP+TLS handshake each.
+    """
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._requests: Dict[str, int] = {}
+
+    def _limit(self, provider: str) -> int:
+        default = PROVIDER_LIMITS.get(provider, DEFAULT_LIMIT)
+        return int(os.getenv(f'{provider.upper()}_MAX_CONNECTIONS', default))
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        client = self._clients.get(provider)
+        if client is None or client.is_closed:
+            limit = self._limit(provider)
+
+            async def count(request):
+                self._requests[provider] = self._requests.get(provider, 0) + 1
+
+            client = httpx.AsyncClient(
+                http2=True,
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(max_connections=limit,
+                                    max_keepalive_connections=limit,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY),
+                event_hooks={'request': [count]},
+            )
+            self._clients[provider] = client
+        return client
+
+    def stats(self) -> Dict[str, dict]:
+        out = {}
+        for provider, client in self._clients.items():
+            pool = getattr(client._transport, '_pool', None)
+            conns = list(getattr(pool, 'connections', []) or [])
+            idle = sum(1 for c in conns if c.is_idle())
+            out[provider] = {
+                'requests': self._requests.get(provider, 0),
+                'max_connections': self._limit(provider),
+                'connections': len(conns),
+                'active': len(conns) - idle,
+                'idle': idle,
+                'closed': client.is_closed,
+            }
+        return out
+
+    async def aclose(self) -> None:
+        for provider, client in list(self._clients.items()):
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f'Error closing {provider} client: {e}')
+        self._clients.clear()
+
+# Singleton instance
+_clients = None
+def get_clients() -> ProviderClients:
+    global _clients
+    if _clients is None:
+        _clients = ProviderClients()
+    return _clients
+
+def get_client(provider: str) -> httpx.AsyncClient:
+    return get_clients().get(provider)
+
+async def close_clients() -> None:
+    if _clients is not None:
+        await _clients.aclose()
@@ -0,0 +1,120 @@
+# backend/src/core/ollama_client.py
+import os
+import json
+import asyncio
+import logging
+import httpx
+from typing import AsyncGenerator, Dict, List, Optional
+from src.core.http_pool import get_client
+
+logger = logging.getLogger('ollama_client')
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Concurrent requests per model; Ollama queues the rest server-side anyway,
+# so holding them here keeps slow models from starving the connection pool.
+MODEL_CONCURRENCY = int(os.getenv("OLLAMA_MODEL_CONCURRENCY", "4"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "3600"))
+
+class OllamaClient:
+    """Async client for the local Ollama server.
+
+    Drop-in for the blocking ollama.generate/ollama.chat calls: responses
+    have the same shape ({'response': ...} and {'message': {...}}). Requests
+    go through the pooled 'ollama' httpx client and are limited per model.
+    Cancelling the awaiting task closes the HTTP stream, which makes Ollama
+    abort the completion.
+    """
+    def __init__(self, base_url: str = OLLAMA_BASE_URL, concurrency: int = MODEL_CONCURRENCY,
+                 timeout: float = OLLAMA_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _limit(self, model: str) -> asyncio.Semaphore:
+        sem = self._limits.get(model)
+        if sem is None:
+            sem = self._limits[model] = asyncio.Semaphore(self.concurrency)
+        return sem
+
+    async def _stream(self, path: str, model: str, payload: dict) -> AsyncGenerator[dict, None]:
+        async with self._limit(model):
+            async with get_client('ollama').stream('POST', f'{self.base_url}{path}',
+                                                   json={**payload, 'stream': True},
+                                                   timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise RuntimeError(f"Ollama {model}: {data['error']}")
+                    yield data
+
+    async def _post(self, path: str, model: str, payload: dict) -> httpx.Response:
+        async with self._limit(model):
+            return await get_client('ollama').post(f'{self.base_url}{path}',
+                                                   json={**payload, 'stream': False},
+                                                   timeout=self.timeout)
+
+    async def _request(self, path: str, model: str, payload: dict) -> dict:
+        resp = await self._post(path, model, payload)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _generate_payload(self, model, prompt, system, images, options) -> dict:
+        payload = {'model': model, 'prompt': prompt}
+        if system:
+            payload['system'] = system
+        if images:
+            payload['images'] = images
+        if options:
+            payload['options'] = options
+        return payload
+
+    async def generate(self, model: str, prompt: str, system: str = None,
+                       images: List[str] = None, options: dict = None) -> dict:
+        return await self._request('/api/generate', model,
+                                   self._generate_payload(model, prompt, system, images, options))
+
+    async def generate_response(self, model: str, prompt: str, system: str = None,
+                                images: List[str] = None, options: dict = None) -> httpx.Response:
+        """generate() returning the unchecked HTTP response, for callers that read its status and headers."""
+        return await self._post('/api/generate', model,
+                                self._generate_payload(model, prompt, system, images, options))
+
+    async def stream_generate(self, model: str, prompt: str, system: str = None,
+                              images: List[str] = None,
+                              options: dict = None) -> AsyncGenerator[str, None]:
+        payload = self._generate_payload(model, prompt, system, images, options)
+        async for data in self._stream('/api/generate', model, payload):
+            if data.get('response'):
+                yield data['response']
+
+    async def chat(self, model: str, messages: List[dict], options: dict = None) -> dict:
+        payload = {'model': model, 'messages': messages}
+        if options:
+            payload['options'] = options
+        return await self._request('/api/chat', model, payload)
+
+    async def stream_chat(self, model: str, messages: List[dict],
+                          options: dict = None) -> AsyncGenerator[str, None]:
+        payload = {'model': model, 'messages': messages}
+        if options:
+            payload['options'] = options
+        async for data in self._stream('/api/chat', model, payload):
+            text = data.get('message', {}).get('content')
+            if text:
+                yield text
+
+    async def embed(self, model: str, text: str) -> List[float]:
+        data = await self._request('/api/embeddings', model, {'model': model, 'prompt': text})
+        return data.get('embedding', [])
+
+# Singleton instance
+_ollama: Optional[OllamaClient] = None
+def get_ollama() -> OllamaClient:
+    global _ollama
+    if _ollama is None:
+        _ollama = OllamaClient()
+    return _ollama
@@ -1,11 +1,24 @@
-﻿import asyncio, httpx, json, os, re, logging
+﻿import asyncio, json, os, re, logging
+from collections import deque
 from pathlib import Path
 from typing import AsyncGenerator, Dict, Any
+from src.core.http_pool import get_client
+from src.core.generation_cache import CACHE_ENABLED, cache_key, get_generation_cache
 
 logger = logging.getLogger('generation')
 WORKSPACE = Path(os.getenv('WORKSPACE_DIR', 'workspace'))
 GEMINI_KEY = os.getenv('GEMINI_API_KEY', '')
 GROQ_KEY = os.getenv('GROQ_API_KEY', '')
+# Hedged requests: if the primary provider has not produced its first chunk
+# by its HEDGE_QUANTILE time-to-first-token, race the other provider too.
+HEDGE_ENABLED = os.getenv('HEDGE_REQUESTS', 'true').lower() not in ('0', 'false', 'no')
+HEDGE_QUANTILE = float(os.getenv('HEDGE_QUANTILE', '0.95'))
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '5.0'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '0.5'))
+HEDGE_MAX_DELAY = float(os.getenv('HEDGE_MAX_DELAY', '20.0'))
+HEDGE_MIN_SAMPLES = 10
+# Feed hybrid-retrieved chunks of the opened project into the prompt when no context is given.
+RETRIEVAL_CONTEXT = os.getenv('RETRIEVAL_CONTEXT', 'true').lower() not in ('0', 'false', 'no')
 
 LANGUAGE_KEYWORDS = {
     'python': ['python','fastapi','django','flask','pandas','pytorch','scikit','pytest','.py'],
@@ -118,6 +131,73 @@ def parse_files(raw: str) -> Dict[str, str]:
         files['output.txt'] = raw.strip()
     return files
 
+FILE_START = '=== FILE: '
+FILE_END = '=== END FILE ==='
+
+class StreamingFileParser:
+    """Incremental counterpart of parse_files for a model stream.
+
+    feed() returns each (path, content) as soon as its END marker arrives;
+    only the file currently being written is held in memory. The raw text is
+    kept until the first file completes so finish() can apply the same
+    fallbacks as parse_files when the model ignores the format.
+    """
+    def __init__(self):
+        self._pending = ''
+        self._path = None
+        self._parts: list[str] = []
+        self._raw: list[str] | None = []
+        self.received = False
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        if not chunk:
+            return []
+        self.received = True
+        if self._raw is not None:
+            self._raw.append(chunk)
+        done = []
+        self._pending += chunk
+        while True:
+            if self._path is None:
+                i = self._pending.find(FILE_START)
+                if i < 0:
+                    self._pending = self._pending[-(len(FILE_START) - 1):]
+                    break
+                nl = self._pending.find('\n', i)
+                if nl < 0:
+                    self._pending = self._pending[i:]
+                    break
+                header = self._pending[i + len(FILE_START):nl]
+                if len(header) < 5 or not header.endswith(' ==='):
+                    self._pending = self._pending[i + 1:]
+                    continue
+                self._path = header[:-4].strip()
+                self._parts = []
+                self._pending = self._pending[nl + 1:]
+            else:
+                j = self._pending.find(FILE_END)
+                if j < 0:
+                    keep = len(FILE_END) - 1
+                    if len(self._pending) > keep:
+                        self._parts.append(self._pending[:-keep])
+                        self._pending = self._pending[-keep:]
+                    break
+                self._parts.append(self._pending[:j])
+                self._pending = self._pending[j + len(FILE_END):]
+                content = ''.join(self._parts).strip()
+                path, self._path, self._parts = self._path, None, []
+                if path and content:
+                    done.append((path, content))
+                    self._raw = None
+        return done
+
+    def finish(self) -> list[tuple[str, str]]:
+        """Fallback files for a stream that produced no complete FILE block."""
+        if self._raw is None:
+            return []
+        raw, self._raw = ''.join(self._raw), None
+        return list(parse_files(raw).items())
+
 async def stream_gemini(messages: list[dict]) -> AsyncGenerator[str, None]:
     url = (f'https://generativelanguage.googleapis.com/v1beta/models/'
            f'gemini-2.0-flash:streamGenerateContent?key={GEMINI_KEY}&alt=sse')
@@ -125,35 +205,149 @@ async def stream_gemini(messages: list[dict]) -> AsyncGenerator[str, None]:
                  'parts':[{'text':m['content']}]} for m in messages]
     body = {'contents': contents,
             'generationConfig': {'temperature': 0.1, 'maxOutputTokens': 16384}}
-    async with httpx.AsyncClient(timeout=300) as client:
-        async with client.stream('POST', url, json=body) as resp:
-            resp.raise_for_status()
-            async for line in resp.aiter_lines():
-                if line.startswith('data: '):
-                    try:
-                        d = json.loads(line[6:])
-                        text = (d.get('candidates',[{}])[0]
-                                 .get('content',{}).get('parts',[{}])[0].get('text',''))
-                        if text: yield text
-                    except: pass
+    async with get_client('gemini').stream('POST', url, json=body) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line.startswith('data: '):
+                try:
+                    d = json.loads(line[6:])
+                    text = (d.get('candidates',[{}])[0]
+                             .get('content',{}).get('parts',[{}])[0].get('text',''))
+                    if text: yield text
+                except: pass
 
 async def stream_groq(messages: list[dict]) -> AsyncGenerator[str, None]:
     headers = {'Authorization': f'Bearer {GROQ_KEY}',
                'Content-Type': 'application/json'}
     body = {'model': 'llama-3.3-70b-versatile', 'messages': messages,
             'stream': True, 'temperature': 0.1, 'max_tokens': 16384}
-    async with httpx.AsyncClient(timeout=300) as client:
-        async with client.stream('POST',
-            'https://api.groq.com/openai/v1/chat/completions',
-            headers=headers, json=body) as resp:
-            resp.raise_for_status()
-            async for line in resp.aiter_lines():
-                if line.startswith('data: '):
-                    try:
-                        d = json.loads(line[6:])
-                        text = d['choices'][0]['delta'].get('content','')
-                        if text: yield text
-                    except: pass
+    async with get_client('groq').stream('POST',
+        'https://api.groq.com/openai/v1/chat/completions',
+        headers=headers, json=body) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line.startswith('data: '):
+                try:
+                    d = json.loads(line[6:])
+                    text = d['choices'][0]['delta'].get('content','')
+                    if text: yield text
+                except: pass
+
+PROVIDER_NAMES = {'gemini': 'Gemini 2.0 Flash', 'groq': 'Groq Llama 3.3 70B'}
+PROVIDER_STREAMS = {'gemini': stream_gemini, 'groq': stream_groq}
+
+class LatencyHistogram:
+    """Rolling time-to-first-token samples for one provider."""
+    BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0)
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def deadline(self) -> float:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, self.quantile(HEDGE_QUANTILE)))
+
+    def snapshot(self) -> dict:
+        counts = {f'<={b}s': 0 for b in self.BUCKETS}
+        counts[f'>{self.BUCKETS[-1]}s'] = 0
+        for s in self.samples:
+            b = next((b for b in self.BUCKETS if s <= b), None)
+            counts[f'<={b}s' if b else f'>{self.BUCKETS[-1]}s'] += 1
+        return {'samples': len(self.samples), 'p50': self.quantile(0.5),
+                'p95': self.quantile(0.95), 'deadline': self.deadline(),
+                'buckets': counts}
+
+PROVIDER_LATENCY = {p: LatencyHistogram() for p in PROVIDER_STREAMS}
+
+def latency_stats() -> Dict[str, dict]:
+    return {p: h.snapshot() for p, h in PROVIDER_LATENCY.items()}
+
+async def timed_stream(provider: str, messages: list[dict]) -> AsyncGenerator[str, None]:
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    first = True
+    async for chunk in PROVIDER_STREAMS[provider](messages):
+        if first:
+            PROVIDER_LATENCY[provider].record(loop.time() - start)
+            first = False
+        yield chunk
+
+async def hedged_stream(messages: list[dict], primary: str,
+                        backup: str) -> AsyncGenerator[Any, None]:
+    """Stream from primary, racing backup if primary is slow or fails.
+
+    Yields text chunks from whichever provider answers first; the other
+    request is cancelled. Also yields log event dicts so the caller can tell
+    the client when the hedge fires and which provider won.
+    """
+    loop = asyncio.get_running_loop()
+    streams, started, pending = {}, {}, {}
+
+    def launch(provider: str) -> None:
+        streams[provider] = PROVIDER_STREAMS[provider](messages)
+        started[provider] = loop.time()
+        pending[asyncio.ensure_future(streams[provider].__anext__())] = provider
+
+    launch(primary)
+    deadline = PROVIDER_LATENCY[primary].deadline()
+    winner, first, error = None, None, None
+    try:
+        while pending and winner is None:
+            timeout = None if backup in streams else deadline
+            done, _ = await asyncio.wait(pending, timeout=timeout,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                yield {'type':'log','message':f'{PROVIDER_NAMES[primary]} slow '
+                       f'(>{deadline:.1f}s to first token), racing {PROVIDER_NAMES[backup]}...'}
+                launch(backup)
+                continue
+            for task in done:
+                provider = pending.pop(task)
+                try:
+                    first = task.result()
+                    winner = provider
+                    break
+                except StopAsyncIteration:
+                    error = RuntimeError(f'{PROVIDER_NAMES[provider]} returned no output')
+                except Exception as e:
+                    error = e
+                logger.warning(f'{provider} failed before first token: {error}')
+            if winner is None and backup not in streams:
+                yield {'type':'log','message':f'{PROVIDER_NAMES[primary]} failed, '
+                       f'switching to {PROVIDER_NAMES[backup]}...'}
+                launch(backup)
+        if winner is None:
+            raise error or RuntimeError('No provider produced output')
+        PROVIDER_LATENCY[winner].record(loop.time() - started[winner])
+    finally:
+        for task, provider in pending.items():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            if provider == primary:
+                # Censored sample: the primary took at least this long.
+                PROVIDER_LATENCY[provider].record(loop.time() - started[provider])
+            await streams[provider].aclose()
+        if winner is None:
+            for stream in streams.values():
+                await stream.aclose()
+    stream = streams[winner]
+    try:
+        yield {'type':'log','message':f'Using {PROVIDER_NAMES[winner]}...'}
+        yield first
+        async for chunk in stream:
+            yield chunk
+    finally:
+        await stream.aclose()
 
 class GenerationOrchestrator:
     async def generate(
@@ -174,51 +368,92 @@ class GenerationOrchestrator:
             yield {'type':'agent','agent':agent,'message':msg}
             await asyncio.sleep(0.05)
         system = build_system_prompt(language)
+        parser = StreamingFileParser()
+        written = {}
+        project = None
+        if extra_context is None and RETRIEVAL_CONTEXT:
+            project, extra_context = await self._retrieve_context(prompt)
+        # The key covers the project and whatever was retrieved from it, so an
+        # answer generated against one project is never replayed for another.
+        key = cache_key(prompt, language, system, extra_context, project) if CACHE_ENABLED else None
+        if key:
+            cached = await asyncio.to_thread(get_generation_cache().get, key)
+            if cached:
+                yield {'type':'log','message':f'Cache hit, replaying {len(cached)} files...'}
+                for filename, content in cached.items():
+                    yield self._write_file(out_dir, filename, content, written)
+                yield {'type':'agent','agent':'debugger','message':'Done!'}
+                yield {'type':'complete','files':list(written),'language':language,
+                       'count':len(written),'cached':True}
+                return
+        if not GEMINI_KEY and not GROQ_KEY:
+            yield {'type':'error','message':'No API key. Add GEMINI_API_KEY or GROQ_API_KEY to .env'}
+            return
         user_content = prompt
         if extra_context:
             user_content = f'EXISTING CODEBASE CONTEXT:\n{extra_context}\n\nTASK: {prompt}'
         messages = [{'role':'user','content':f'{system}\n\n{user_content}'}]
-        full_text = ''
-        api_used = 'none'
-        if not GEMINI_KEY and not GROQ_KEY:
-            yield {'type':'error','message':'No API key. Add GEMINI_API_KEY or GROQ_API_KEY to .env'}
-            return
+        hedged = HEDGE_ENABLED and bool(GEMINI_KEY and GROQ_KEY)
         try:
-            if GEMINI_KEY:
-                api_used = 'Gemini 2.0 Flash'
-                yield {'type':'log','message':f'Using {api_used}...'}
-                async for chunk in stream_gemini(messages):
-                    full_text += chunk
-                    yield {'type':'chunk','text':chunk}
+            if hedged:
+                stream = hedged_stream(messages, 'gemini', 'groq')
             else:
-                api_used = 'Groq Llama 3.3 70B'
-                yield {'type':'log','message':f'Using {api_used}...'}
-                async for chunk in stream_groq(messages):
-                    full_text += chunk
-                    yield {'type':'chunk','text':chunk}
+                provider = 'gemini' if GEMINI_KEY else 'groq'
+                yield {'type':'log','message':f'Using {PROVIDER_NAMES[provider]}...'}
+                stream = timed_stream(provider, messages)
+            async for event in self._relay(stream, parser, out_dir, written):
+                yield event
         except Exception as e:
-            if GROQ_KEY and not full_text and GEMINI_KEY:
+            if GROQ_KEY and not parser.received and GEMINI_KEY and not hedged:
                 yield {'type':'log','message':'Gemini failed, switching to Groq...'}
-                async for chunk in stream_groq(messages):
-                    full_text += chunk
-                    yield {'type':'chunk','text':chunk}
+                async for event in self._relay(timed_stream('groq', messages), parser, out_dir, written):
+                    yield event
             else:
                 yield {'type':'error','message':str(e)}
                 return
         yield {'type':'agent','agent':'reviewer','message':'Parsing files...'}
-        files = parse_files(full_text)
-        if not files:
+        for filename, content in parser.finish():
+            yield self._write_file(out_dir, filename, content, written)
+        if not written:
             yield {'type':'error','message':'No files parsed. Try a more specific prompt.'}
             return
-        written = []
-        for filename, content in files.items():
-            fp = out_dir / filename
-            fp.parent.mkdir(parents=True, exist_ok=True)
-            fp.write_text(content, encoding='utf-8')
-            written.append(filename)
-            yield {'type':'file','path':filename,'content':content}
+        if key:
+            await asyncio.to_thread(get_generation_cache().put, key, written, language)
         yield {'type':'agent','agent':'debugger','message':'Done!'}
-        yield {'type':'complete','files':written,'language':language,'count':len(written)}
+        yield {'type':'complete','files':list(written),'language':language,'count':len(written)}
+
+    async def _retrieve_context(self, prompt: str) -> tuple[str | None, str | None]:
+        """(project root, context retrieved from it); (None, None) when no project is open."""
+        from src.core.graph_utils import get_project_root
+        from src.retrieval.hybrid_rag import get_retriever
+        root = get_project_root()
+        if root is None:  # nothing opened; never index the generation output dir
+            return None, None
+        try:
+            retriever = get_retriever(root)
+            chunks = await retriever.retrieve(prompt)
+        except Exception as e:
+            logger.warning(f'Retrieval skipped: {e}')
+            return root, None
+        return root, retriever.build_context_string(chunks) or None
+
+    async def _relay(self, stream, parser: StreamingFileParser, out_dir: Path,
+                     written: dict) -> AsyncGenerator[Dict[str, Any], None]:
+        async for chunk in stream:
+            if isinstance(chunk, dict):
+                yield chunk
+                continue
+            yield {'type':'chunk','text':chunk}
+            for filename, content in parser.feed(chunk):
+                yield self._write_file(out_dir, filename, content, written)
+
+    def _write_file(self, out_dir: Path, filename: str, content: str,
+                    written: dict) -> Dict[str, Any]:
+        fp = out_dir / filename
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        fp.write_text(content, encoding='utf-8')
+        written[filename] = content
+        return {'type':'file','path':filename,'content':content}
 
 async def run_agent_step(
     agent_name: str, prompt: str,
@@ -0,0 +1,74 @@
+﻿# backend/src/gnn/embedding_store.py
+import os
+import json
+import hashlib
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Tuple
+from src.gnn.graph_builder import SOURCE_SUFFIXES
+from src.system.fs_walk import walk_files
+
+STORE_VERSION = 1
+
+def source_state(workspace_path: str) -> list:
+    """Sorted (path, size, mtime) of the workspace's source files."""
+    root = Path(workspace_path)
+    entries = []
+    # Same file set as CodebaseGraph._scan
+    for entry in walk_files(root, suffixes=SOURCE_SUFFIXES):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        entries.append((os.path.relpath(entry.path, root), st.st_size, st.st_mtime_ns))
+    return sorted(entries)
+
+def workspace_fingerprint(workspace_path: str, model_path: str = None, sources: list = None) -> str:
+    """Hash of the source file set (path, size, mtime) and the model weights.
+
+    Only stats are read, so checking whether stored embeddings are still
+    valid costs a directory walk rather than a graph build. Pass sources
+    (from source_state) taken before reading the files to fingerprint that
+    snapshot instead of the workspace as it is now.
+    """
+    h = hashlib.sha1()
+    for entry in (source_state(workspace_path) if sources is None else sources):
+        h.update(repr(entry).encode("utf-8"))
+    if model_path and os.path.exists(model_path):
+        st = os.stat(model_path)
+        h.update(repr((st.st_size, st.st_mtime_ns)).encode("utf-8"))
+    return h.hexdigest()
+
+class EmbeddingStore:
+    """Node embeddings as a .npy matrix plus a JSON manifest of node names.
+
+    The manifest records the fingerprint the embeddings were computed for;
+    load() returns a memory-mapped matrix only when it still matches.
+    """
+    def __init__(self, store_dir: str = "./backend/models"):
+        self.store_dir = Path(store_dir)
+        self.matrix_path = self.store_dir / "gnn_embeddings.npy"
+        self.manifest_path = self.store_dir / "gnn_embeddings.json"
+
+    def save(self, node_list: List[str], embeddings: np.ndarray, fingerprint: str) -> None:
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.matrix_path.with_suffix(".tmp.npy")
+        np.save(tmp, np.asarray(embeddings, dtype=np.float32))
+        os.replace(tmp, self.matrix_path)
+        manifest = {"version": STORE_VERSION, "fingerprint": fingerprint,
+                    "shape": list(np.shape(embeddings)), "nodes": node_list}
+        tmp = self.manifest_path.with_suffix(".tmp.json")
+        tmp.write_text(json.dumps(manifest), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def load(self, fingerprint: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if manifest.get("version") != STORE_VERSION or manifest.get("fingerprint") != fingerprint:
+                return None
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if list(matrix.shape) != manifest["shape"]:
+            return None
+        return manifest["nodes"], matrix
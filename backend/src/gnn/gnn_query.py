@@ -2,9 +2,16 @@
 import torch
 import numpy as np
 from pathlib import Path
-from src.gnn.graph_builder import CodebaseGraph
+from src.gnn.graph_builder import get_graph_arrays
 from src.gnn.gnn_model import CodeGraphSAGE
-import pickle
+from src.gnn.embedding_store import EmbeddingStore, workspace_fingerprint
+try:
+    import hnswlib
+except ImportError:  # optional: exact search is used without it
+    hnswlib = None
+
+# Graphs with more nodes than this use an HNSW index when hnswlib is installed.
+ANN_MIN_NODES = 20000
 
 class GNNQuery:
     def __init__(self, model_path="./backend/models/gnn_model.pt", workspace_path="./workspace"):
@@ -13,35 +20,25 @@ class GNNQuery:
         self.model = None
         self.embeddings = None
         self.node_list = None
+        self.node_index = {}
+        self.normalized = None
+        self.ann = None
         self.load_model(model_path)
 
     def load_model(self, model_path):
-        # Rebuild graph to get node features and indices
-        builder = CodebaseGraph(self.workspace_path)
-        nx_graph = builder.build()
-        self.node_list = list(nx_graph.nodes)
-        # Build feature matrix (same as trainer)
-        features = []
-        for node in self.node_list:
-            feat = builder.node_features.get(node, {})
-            loc = min(feat.get("loc", 0) / 1000, 1.0)
-            func_count = min(feat.get("func_count", 0) / 20, 1.0)
-            class_count = min(feat.get("class_count", 0) / 10, 1.0)
-            lang_map = {"py": 0, "js": 1, "ts": 2, "jsx": 3, "tsx": 4}
-            lang_onehot = [0]*5
-            lang = feat.get("language", "py")
-            if lang in lang_map:
-                lang_onehot[lang_map[lang]] = 1
-            features.append([loc, func_count, class_count] + lang_onehot)
-        x = torch.tensor(features, dtype=torch.float).to(self.device)
-        # Build edge index
-        edge_index = []
-        for u, v in nx_graph.edges:
-            u_idx = self.node_list.index(u)
-            v_idx = self.node_list.index(v)
-            edge_index.append([u_idx, v_idx])
-            edge_index.append([v_idx, u_idx])
-        edge_index = torch.tensor(edge_index, dtype=torch.long).t().contiguous().to(self.device)
+        # Serve stored embeddings while the workspace and model are unchanged
+        store = EmbeddingStore(str(Path(model_path).parent))
+        fingerprint = workspace_fingerprint(self.workspace_path, model_path)
+        stored = store.load(fingerprint)
+        if stored is not None:
+            self.node_list, self.embeddings = stored
+            self._index_embeddings()
+            return
+        # Reuse the graph build shared with the trainer, refreshed so the
+        # node set matches the fingerprint the embeddings are stored under
+        self.node_list, _, features, edge_index = get_graph_arrays(self.workspace_path, refresh=True)
+        x = torch.from_numpy(features).to(self.device)
+        edge_index = torch.from_numpy(edge_index).contiguous().to(self.device)
         # Initialize model
         in_channels = x.shape[1]
         self.model = CodeGraphSAGE(in_channels, 64, 128).to(self.device)
@@ -50,12 +47,47 @@ class GNNQuery:
         with torch.no_grad():
             z = self.model(x, edge_index)
             self.embeddings = z.cpu().numpy()
+        store.save(self.node_list, self.embeddings, fingerprint)
+        self._index_embeddings()
+
+    def _index_embeddings(self):
+        """Normalize embeddings once so similarity is a single dot product."""
+        self.node_index = {node: i for i, node in enumerate(self.node_list)}
+        emb = np.asarray(self.embeddings, dtype=np.float32)
+        norms = np.linalg.norm(emb, axis=1, keepdims=True)
+        self.normalized = emb / (norms + 1e-8)
+        self.ann = None
+        if hnswlib is not None and len(self.node_list) > ANN_MIN_NODES:
+            self.ann = hnswlib.Index(space="ip", dim=self.normalized.shape[1])
+            self.ann.init_index(max_elements=len(self.node_list), ef_construction=200, M=16)
+            self.ann.add_items(self.normalized, np.arange(len(self.node_list)))
+            self.ann.set_ef(64)
 
     def get_related_files(self, target_file: str, top_k=5):
-        if target_file not in self.node_list:
-            return []
-        idx = self.node_list.index(target_file)
-        target_emb = self.embeddings[idx]
-        similarities = [np.dot(target_emb, emb) / (np.linalg.norm(target_emb)*np.linalg.norm(emb)+1e-8) for emb in self.embeddings]
-        nearest = sorted(enumerate(similarities), key=lambda x: x[1], reverse=True)[1:top_k+1]
-        return [{"file": self.node_list[i], "similarity": float(s)} for i, s in nearest]
+        return self.get_related_files_batch([target_file], top_k)[target_file]
+
+    def get_related_files_batch(self, target_files, top_k=5):
+        """Related files for many targets with one matrix product."""
+        results = {t: [] for t in target_files}
+        known = [t for t in target_files if t in self.node_index]
+        n = len(self.node_list or [])
+        if not known or n < 2:
+            return results
+        rows = np.array([self.node_index[t] for t in known])
+        k = min(top_k + 1, n)
+        if self.ann is not None:
+            labels, distances = self.ann.knn_query(self.normalized[rows], k=k)
+            sims = 1 - distances
+        else:
+            labels, sims = [], []
+            # Bound the (targets x nodes) score block for large batches.
+            for start in range(0, len(rows), 256):
+                scores = self.normalized[rows[start:start + 256]] @ self.normalized.T
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                labels.extend(top)
+                sims.extend(np.take_along_axis(scores, top, axis=1))
+        for target, row, idx, sim in zip(known, rows, labels, sims):
+            order = np.argsort(-sim)
+            related = [(int(idx[j]), float(sim[j])) for j in order if idx[j] != row][:top_k]
+            results[target] = [{"file": self.node_list[i], "similarity": s} for i, s in related]
+        return results
@@ -6,8 +6,9 @@ from sklearn.preprocessing import StandardScaler
 import numpy as np
 from pathlib import Path
 import networkx as nx
-from src.gnn.graph_builder import CodebaseGraph
+from src.gnn.graph_builder import get_graph_arrays
 from src.gnn.gnn_model import CodeGraphSAGE
+from src.gnn.embedding_store import EmbeddingStore, source_state, workspace_fingerprint
 
 class GNNTrainer:
     def __init__(self, workspace_path="./workspace", model_save_path="./backend/models/gnn_model.pt"):
@@ -17,35 +18,17 @@ class GNNTrainer:
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model = None
 
-    def build_pyg_graph(self):
-        builder = CodebaseGraph(self.workspace_path)
-        nx_graph = builder.build()
-        # Convert to PyG Data
-        node_list = list(nx_graph.nodes)
-        node_to_idx = {node: i for i, node in enumerate(node_list)}
-        # Edge index
-        edge_index = []
-        for u, v in nx_graph.edges:
-            edge_index.append([node_to_idx[u], node_to_idx[v]])
-            edge_index.append([node_to_idx[v], node_to_idx[u]])  # undirected
-        edge_index = torch.tensor(edge_index, dtype=torch.long).t().contiguous()
-        # Node features (simple: one-hot encode language + normalized LOC)
-        features = []
-        for node in node_list:
-            feat = builder.node_features.get(node, {})
-            loc = min(feat.get("loc", 0) / 1000, 1.0)  # normalize
-            func_count = min(feat.get("func_count", 0) / 20, 1.0)
-            class_count = min(feat.get("class_count", 0) / 10, 1.0)
-            lang_map = {"py": 0, "js": 1, "ts": 2, "jsx": 3, "tsx": 4}
-            lang_onehot = [0]*5
-            lang = feat.get("language", "py")
-            if lang in lang_map:
-                lang_onehot[lang_map[lang]] = 1
-            features.append([loc, func_count, class_count] + lang_onehot)
-        x = torch.tensor(features, dtype=torch.float)
+    def build_pyg_graph(self, refresh=True):
+        # refresh applies workspace changes to the shared graph incrementally
+        node_list, _, features, edge_index = get_graph_arrays(self.workspace_path, refresh=refresh)
+        x = torch.from_numpy(features)
+        edge_index = torch.from_numpy(edge_index).contiguous()
         return x, edge_index, node_list
 
     def train(self, epochs=50):
+        # Snapshot the sources before reading them, so files edited during
+        # training make the stored embeddings stale rather than current.
+        sources = source_state(self.workspace_path)
         x, edge_index, node_list = self.build_pyg_graph()
         x = x.to(self.device)
         edge_index = edge_index.to(self.device)
@@ -67,6 +50,11 @@ class GNNTrainer:
                 print(f"Epoch {epoch}, Loss: {loss.item():.4f}")
         # Save model
         torch.save(self.model.state_dict(), self.model_save_path)
-        # Save node embeddings
-        embeddings = z.detach().cpu().numpy()
+        # Save node embeddings as GNNQuery computes them (eval mode), tagged with
+        # the workspace/model fingerprint so queries can serve them directly.
+        self.model.eval()
+        with torch.no_grad():
+            embeddings = self.model(x, edge_index).cpu().numpy()
+        fingerprint = workspace_fingerprint(self.workspace_path, str(self.model_save_path), sources)
+        EmbeddingStore(str(self.model_save_path.parent)).save(node_list, embeddings, fingerprint)
         return {node_list[i]: embeddings[i] for i in range(len(node_list))}
@@ -1,67 +1,320 @@
 ﻿# backend/src/gnn/graph_builder.py
+import os
 import networkx as nx
+import numpy as np
 from pathlib import Path
 import ast
 import re
-from typing import Dict, Set, Tuple
+import hashlib
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+from src.core.graph_utils import is_active_workspace, set_current_graph
+from src.system.fs_walk import walk_files
+
+logger = logging.getLogger('graph_builder')
+
+SOURCE_SUFFIXES = {".py", ".js", ".ts", ".jsx", ".tsx"}
+JS_SUFFIXES = (".ts", ".tsx", ".js", ".jsx")
+LANG_INDEX = {"py": 0, "js": 1, "ts": 2, "jsx": 3, "tsx": 4}
+# Below this many files the process pool's startup costs more than it saves.
+PARALLEL_MIN_FILES = 200
+JS_IMPORT_RE = re.compile(r"""(?:\bfrom\s*|\bimport\s*\(?\s*|\brequire\s*\(\s*)['"]([^'"]+)['"]""")
+
+def _python_imports(code: str) -> Set[str]:
+    """Top-level module names imported by a Python file."""
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        return set()
+    modules = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.add(node.module.split('.')[0])
+    return modules
+
+def _js_specifiers(path: str, code: str) -> List[str]:
+    """Import specifiers of a JS/TS file, via the tree-sitter ASTParser when available."""
+    try:
+        from src.ast.parser import get_ast_parser
+        summary = get_ast_parser().parse_file(path, code)
+        if "error" not in summary:
+            return [imp["module"] for imp in summary["imports"] if imp.get("module")]
+    except ImportError:
+        pass
+    return JS_IMPORT_RE.findall(code)
+
+def resolve_js_specifier(rel_path: str, specifier: str) -> List[str]:
+    """Workspace-relative files a relative JS/TS specifier may refer to, in priority order."""
+    if not specifier.startswith("."):
+        return []  # package import
+    base = os.path.normpath(os.path.join(os.path.dirname(rel_path), specifier))
+    if base == ".." or base.startswith(".." + os.sep):
+        return []
+    stem, ext = os.path.splitext(base)
+    candidates = []
+    if ext in SOURCE_SUFFIXES:
+        candidates.append(base)
+        base = stem  # "./util.js" may be compiled from util.ts
+    candidates += [base + e for e in JS_SUFFIXES]
+    candidates += [os.path.join(base, "index" + e) for e in JS_SUFFIXES]
+    return list(dict.fromkeys(candidates))
+
+def _parse_source(full_path: str) -> Optional[dict]:
+    """Read one source file and extract what the graph needs.
+
+    Module-level so it can run in ProcessPoolExecutor workers.
+    """
+    try:
+        with open(full_path, "r", encoding="utf-8") as f:
+            code = f.read()
+        mtime = os.stat(full_path).st_mtime_ns
+    except Exception as e:
+        return {"error": str(e)}
+    suffix = os.path.splitext(full_path)[1]
+    return {
+        "mtime": mtime,
+        "digest": hashlib.sha1(code.encode("utf-8")).hexdigest(),
+        # Simple features
+        "features": {
+            "loc": len(code.splitlines()),
+            "func_count": code.count("def ") + code.count("function "),
+            "class_count": code.count("class "),
+            "language": suffix[1:],
+        },
+        "modules": sorted(_python_imports(code)) if suffix == ".py" else [],
+        "specifiers": _js_specifiers(full_path, code) if suffix != ".py" else [],
+    }
+
+def _parse_all(paths: List[str]) -> List[Optional[dict]]:
+    if len(paths) < PARALLEL_MIN_FILES:
+        return [_parse_source(p) for p in paths]
+    try:
+        # Spawned, not forked: another thread may hold the ASTParser lock,
+        # and a forked worker would inherit it locked and hang in parse_file.
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(_parse_source, paths, chunksize=64))
+    except (OSError, RuntimeError) as e:
+        logger.warning(f'Process pool unavailable, parsing serially: {e}')
+        return [_parse_source(p) for p in paths]
 
 class CodebaseGraph:
+    """Import graph of the workspace's source files.
+
+    build() walks everything once; update() then re-parses only files whose
+    mtime and content hash changed, and rewires just their edges. version
+    increments whenever the graph changes. Python imports resolve through a
+    module-name index, relative JS/TS imports through candidate file paths.
+    """
     def __init__(self, workspace_path: str = "./workspace"):
         self.workspace_path = Path(workspace_path)
         self.graph = nx.DiGraph()
         self.node_features = {}  # file -> feature dict
+        self.module_index: Dict[str, List[str]] = {}  # module name -> files
+        self.file_state: Dict[str, Tuple[int, str]] = {}  # file -> (mtime_ns, sha1)
+        # file -> import keys: Python module names or candidate JS/TS file paths
+        self.file_imports: Dict[str, Set[str]] = {}
+        self.importers: Dict[str, Set[str]] = {}  # import key -> importing files
+        self.version = 0
+
+    def _scan(self):
+        for entry in walk_files(self.workspace_path, suffixes=SOURCE_SUFFIXES):
+            filepath = Path(entry.path)
+            yield str(filepath.relative_to(self.workspace_path)), filepath
 
     def build(self):
         """Build graph from all Python/JS files in workspace."""
         self.graph.clear()
         self.node_features.clear()
-        for filepath in self.workspace_path.rglob("*"):
-            if filepath.suffix in [".py", ".js", ".ts", ".jsx", ".tsx"]:
-                self._add_file(str(filepath.relative_to(self.workspace_path)), filepath)
+        self.module_index.clear()
+        self.file_state.clear()
+        self.file_imports.clear()
+        self.importers.clear()
+        files = list(self._scan())
+        for rel_path, _ in files:
+            self.graph.add_node(rel_path)
+            self._index_module(rel_path)
+        parsed = _parse_all([str(fp) for _, fp in files])
+        for (rel_path, filepath), result in zip(files, parsed):
+            self._apply(rel_path, filepath, result)
+        for rel_path, _ in files:
+            self._link_imports(rel_path, self.file_imports.get(rel_path, ()))
+        self.version += 1
         return self.graph
 
-    def _add_file(self, rel_path: str, full_path: Path):
+    def update(self, paths=None) -> Dict[str, List[str]]:
+        """Apply workspace changes incrementally.
+
+        With paths, only those files are checked; otherwise the workspace is
+        stat-walked. Returns the added, modified and removed files.
+        """
+        changes = {"added": [], "modified": [], "removed": []}
+        if paths is None:
+            current = dict(self._scan())
+            removed = [n for n in self.graph.nodes if n not in current]
+        else:
+            current, removed = {}, []
+            for p in paths:
+                full = Path(p) if Path(p).is_absolute() else self.workspace_path / p
+                try:
+                    rel_path = str(full.relative_to(self.workspace_path))
+                except ValueError:
+                    continue
+                if full.is_file() and full.suffix in SOURCE_SUFFIXES:
+                    current[rel_path] = full
+                elif rel_path in self.graph:
+                    removed.append(rel_path)
+        for rel_path in removed:
+            self._remove_file(rel_path)
+            changes["removed"].append(rel_path)
+        stale = []
+        for rel_path, filepath in current.items():
+            state = self.file_state.get(rel_path)
+            try:
+                if state and rel_path in self.graph and filepath.stat().st_mtime_ns == state[0]:
+                    continue
+            except OSError:
+                continue
+            stale.append((rel_path, filepath))
+        parsed = _parse_all([str(fp) for _, fp in stale])
+        for (rel_path, filepath), result in zip(stale, parsed):
+            is_new = rel_path not in self.graph
+            if is_new:
+                self.graph.add_node(rel_path)
+                self._index_module(rel_path)
+            if not self._apply(rel_path, filepath, result) and not is_new:
+                continue
+            self.graph.remove_edges_from(list(self.graph.out_edges(rel_path)))
+            self._link_imports(rel_path, self.file_imports.get(rel_path, ()))
+            if is_new:
+                # Files that already imported this module/path now resolve to it
+                for key in self._import_keys(rel_path):
+                    for importer in self.importers.get(key, ()):
+                        if importer != rel_path:
+                            self.graph.add_edge(importer, rel_path)
+            changes["added" if is_new else "modified"].append(rel_path)
+        if any(changes.values()):
+            self.version += 1
+        return changes
+
+    def _module_name(self, rel_path: str) -> str | None:
+        p = Path(rel_path)
+        if p.suffix != ".py":
+            return None
+        return (p.parent.name if p.stem == "__init__" else p.stem) or None
+
+    def _import_keys(self, rel_path: str) -> List[str]:
+        """Keys under which other files' imports can refer to this file."""
+        name = self._module_name(rel_path)
+        return [name] if name else [rel_path]
+
+    def _index_module(self, rel_path: str):
+        name = self._module_name(rel_path)
+        if name:
+            self.module_index.setdefault(name, []).append(rel_path)
+
+    def _set_imports(self, rel_path: str, keys: Set[str]):
+        for key in self.file_imports.get(rel_path, set()) - keys:
+            self.importers.get(key, set()).discard(rel_path)
+        for key in keys:
+            self.importers.setdefault(key, set()).add(rel_path)
+        self.file_imports[rel_path] = keys
+
+    def _remove_file(self, rel_path: str):
+        self.graph.remove_node(rel_path)
+        self.node_features.pop(rel_path, None)
+        self.file_state.pop(rel_path, None)
+        self._set_imports(rel_path, set())
+        self.file_imports.pop(rel_path, None)
+        name = self._module_name(rel_path)
+        if name and rel_path in self.module_index.get(name, []):
+            self.module_index[name].remove(rel_path)
+
+    def _apply(self, rel_path: str, full_path: Path, parsed: Optional[dict]) -> bool:
+        """Store a parse result for a file; False if its content is unchanged."""
+        if not parsed or "error" in parsed:
+            print(f"Error parsing {full_path}: {parsed and parsed.get('error')}")
+            return True
+        old = self.file_state.get(rel_path)
+        self.file_state[rel_path] = (parsed["mtime"], parsed["digest"])
+        if old and old[1] == parsed["digest"]:
+            return False
+        self.node_features[rel_path] = parsed["features"]
+        keys = set(parsed["modules"])
+        for spec in parsed["specifiers"]:
+            keys.update(resolve_js_specifier(rel_path, spec))
+        self._set_imports(rel_path, keys)
+        return True
+
+    def _add_file(self, rel_path: str, full_path: Path) -> bool:
         self.graph.add_node(rel_path)
-        # Compute basic features
-        try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                code = f.read()
-            # Simple features
-            loc = len(code.splitlines())
-            func_count = code.count("def ") + code.count("function ")
-            class_count = code.count("class ")
-            self.node_features[rel_path] = {
-                "loc": loc,
-                "func_count": func_count,
-                "class_count": class_count,
-                "language": full_path.suffix[1:]
-            }
-            # Extract imports (Python)
-            if full_path.suffix == ".py":
-                self._extract_python_imports(rel_path, code)
-            # For JS/TS, we could use regex or tree-sitter, but keep simple for now
-        except Exception as e:
-            print(f"Error parsing {full_path}: {e}")
-
-    def _extract_python_imports(self, node_path: str, code: str):
-        try:
-            tree = ast.parse(code)
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Import):
-                    for alias in node.names:
-                        imported = alias.name.split('.')[0]
-                        # Find matching file (simplistic)
-                        for other in self.graph.nodes:
-                            if other.endswith(f"{imported}.py"):
-                                self.graph.add_edge(node_path, other)
-                elif isinstance(node, ast.ImportFrom):
-                    module = node.module.split('.')[0] if node.module else ""
-                    if module:
-                        for other in self.graph.nodes:
-                            if other.endswith(f"{module}.py"):
-                                self.graph.add_edge(node_path, other)
-        except:
-            pass
+        return self._apply(rel_path, full_path, _parse_source(str(full_path)))
+
+    def _link_imports(self, node_path: str, keys):
+        for key in keys:
+            targets = self.module_index.get(key) or ([key] if key in self.graph else ())
+            for other in targets:
+                if other != node_path:
+                    self.graph.add_edge(node_path, other)
 
     def get_node_features(self) -> Dict:
         return self.node_features
+
+    def to_arrays(self):
+        """(node_list, node_to_idx, features, edge_index) for the built graph.
+
+        features is a float32 [N, 8] matrix (size features + language one-hot)
+        and edge_index an int64 [2, 2E] array with both edge directions.
+        """
+        node_list = list(self.graph.nodes)
+        node_to_idx = {node: i for i, node in enumerate(node_list)}
+        features = np.zeros((len(node_list), 3 + len(LANG_INDEX)), dtype=np.float32)
+        for i, node in enumerate(node_list):
+            feat = self.node_features.get(node, {})
+            features[i, 0] = min(feat.get("loc", 0) / 1000, 1.0)
+            features[i, 1] = min(feat.get("func_count", 0) / 20, 1.0)
+            features[i, 2] = min(feat.get("class_count", 0) / 10, 1.0)
+            lang = feat.get("language", "py")
+            if lang in LANG_INDEX:
+                features[i, 3 + LANG_INDEX[lang]] = 1
+        edges = np.fromiter((node_to_idx[n] for e in self.graph.edges for n in e),
+                            dtype=np.int64, count=2 * self.graph.number_of_edges()).reshape(-1, 2).T
+        edge_index = np.concatenate([edges, edges[::-1]], axis=1)
+        return node_list, node_to_idx, features, edge_index
+
+# One live graph per workspace, shared by GraphQuery, GNN training/querying
+# and retrieval; consumers refresh it incrementally instead of rebuilding.
+_graphs: Dict[str, CodebaseGraph] = {}
+_arrays: Dict[str, tuple] = {}  # workspace -> (graph version, to_arrays())
+_graphs_lock = threading.RLock()
+
+def get_codebase_graph(workspace_path: str = "./workspace", refresh: bool = True) -> CodebaseGraph:
+    """Shared CodebaseGraph for a workspace, built once and then updated in place."""
+    key = os.path.abspath(workspace_path)
+    with _graphs_lock:
+        builder = _graphs.get(key)
+        if builder is None:
+            builder = CodebaseGraph(workspace_path)
+            builder.build()
+            _graphs[key] = builder
+        elif refresh:
+            builder.update()
+        # Only the open project's graph is published for GraphQuery and
+        # retrieval; building another workspace's graph must not replace it.
+        if is_active_workspace(workspace_path):
+            set_current_graph(builder.graph)
+        return builder
+
+def get_graph_arrays(workspace_path: str = "./workspace", refresh: bool = False):
+    """CodebaseGraph.to_arrays() for the shared graph, recomputed only when it changed."""
+    key = os.path.abspath(workspace_path)
+    with _graphs_lock:
+        builder = get_codebase_graph(workspace_path, refresh)
+        cached = _arrays.get(key)
+        if cached is None or cached[0] != builder.version:
+            _arrays[key] = (builder.version, builder.to_arrays())
+        return _arrays[key][1]
@@ -2,11 +2,11 @@
 import asyncio
 import time
 from src.inference.speculative_decoder import SpeculativeDecoder
-import ollama
+from src.core.ollama_client import get_ollama
 
 async def standard_generation(prompt: str, model="codellama", max_tokens=100):
     start = time.time()
-    response = ollama.generate(model=model, prompt=prompt, options={"num_predict": max_tokens})
+    response = await get_ollama().generate(model=model, prompt=prompt, options={"num_predict": max_tokens})
     elapsed = time.time() - start
     output_len = len(response.get('response', '').split())
     tokens_per_sec = output_len / elapsed if elapsed > 0 else 0
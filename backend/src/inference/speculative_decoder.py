@@ -1,9 +1,9 @@
 ﻿# backend/src/inference/speculative_decoder.py
 import asyncio
 import json
-import httpx
 import logging
 from typing import AsyncGenerator, List, Optional
+from src.core.http_pool import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -23,15 +23,14 @@ class SpeculativeDecoder:
             "stream": False,
             "options": {"num_predict": num_tokens}
         }
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=payload)
-            data = response.json()
-            full_response = data.get("response", "")
-            # Split into tokens (naive split by space – Ollama doesn't return token list)
-            # For simplicity, assume tokens are roughly words; real impl would use tokenizer.
-            # We'll treat spaces as delimiters.
-            tokens = full_response.split()
-            return tokens[:num_tokens]
+        response = await get_client("ollama").post(url, json=payload, timeout=30.0)
+        data = response.json()
+        full_response = data.get("response", "")
+        # Split into tokens (naive split by space – Ollama doesn't return token list)
+        # For simplicity, assume tokens are roughly words; real impl would use tokenizer.
+        # We'll treat spaces as delimiters.
+        tokens = full_response.split()
+        return tokens[:num_tokens]
 
     async def _verify_tokens(self, prefix: str, draft_tokens: List[str]) -> tuple:
         """Ask the target model to verify the draft tokens in one forward pass."""
@@ -45,24 +44,23 @@ class SpeculativeDecoder:
             "stream": False,
             "options": {"num_predict": 1}  # we only need the next token(s) to verify
         }
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(url, json=payload)
-            data = response.json()
-            # The target model's output should start with the next token after prefix.
-            # For simplicity, we'll compare the first word of the continuation.
-            target_continuation = data.get("response", "").strip()
-            # Determine how many of the draft tokens match the target's continuation
-            accepted = 0
-            for i, t in enumerate(draft_tokens):
-                if target_continuation.startswith(t):
-                    accepted = i + 1
-                    # Remove the accepted part from target_continuation for next iteration?
-                    target_continuation = target_continuation[len(t):].lstrip()
-                else:
-                    break
-            # If none accepted, we still need the correct next token (from target)
-            correct_next = target_continuation.split()[0] if target_continuation else draft_tokens[0]
-            return accepted, correct_next
+        response = await get_client("ollama").post(url, json=payload, timeout=30.0)
+        data = response.json()
+        # The target model's output should start with the next token after prefix.
+        # For simplicity, we'll compare the first word of the continuation.
+        target_continuation = data.get("response", "").strip()
+        # Determine how many of the draft tokens match the target's continuation
+        accepted = 0
+        for i, t in enumerate(draft_tokens):
+            if target_continuation.startswith(t):
+                accepted = i + 1
+                # Remove the accepted part from target_continuation for next iteration?
+                target_continuation = target_continuation[len(t):].lstrip()
+            else:
+                break
+        # If none accepted, we still need the correct next token (from target)
+        correct_next = target_continuation.split()[0] if target_continuation else draft_tokens[0]
+        return accepted, correct_next
 
     async def generate(self, prompt: str, max_tokens: int = 2000) -> AsyncGenerator[str, None]:
         """Stream tokens using speculative decoding."""
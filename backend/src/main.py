@@ -1,14 +1,30 @@
 ﻿import asyncio
 import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Response, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from src.generation import GenerationOrchestrator
+from src.generation import GenerationOrchestrator, latency_stats
 from src.system.file_manager import FileManager
 from src.system.workspace_manager import WorkspaceManager
 from src.mcp_routes import router as mcp_router
+from src.api.ast_routes import router as ast_router
+from src.core.http_pool import get_clients, close_clients
+from src.core.generation_cache import get_generation_cache
+from src.system.shell_sessions import get_shell_sessions
+from src.analytics import close_analytics
 
-app = FastAPI(title="VibeCoder API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await close_clients()
+    await get_shell_sessions().close_all()
+    await asyncio.to_thread(close_analytics)
+
+app = FastAPI(title="VibeCoder API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,12 +45,63 @@ async def root():
 @app.post("/system/browse")
 async def system_browse(body: dict):
     import dataclasses
-    node = file_mgr.browse(body['path'], body.get('max_depth', 3))
+    node = await asyncio.to_thread(file_mgr.browse, body['path'], body.get('max_depth', 3))
     return dataclasses.asdict(node)
 
+@app.post("/system/list")
+async def system_list(body: dict):
+    # One level per call; pass next_cursor back as cursor for the following page
+    return await asyncio.to_thread(file_mgr.list_dir, body['path'], body.get('cursor'),
+                                   body.get('limit', 500))
+
 @app.post("/system/read")
 async def system_read(body: dict):
-    return file_mgr.read(body['path'])
+    return await asyncio.to_thread(
+        file_mgr.read, body['path'], body.get('offset', 0), body.get('length'),
+        body.get('start_line'), body.get('end_line'))
+
+@app.get("/system/read_stream")
+async def system_read_stream(path: str, request: Request, offset: int = 0, length: int | None = None):
+    """Raw file bytes streamed in chunks; honours a single 'Range: bytes=a-b' header."""
+    import mimetypes
+    from fastapi.responses import StreamingResponse
+    def stat():
+        file_mgr._check(path)  # before stat, so blocked files don't leak their size
+        st = os.stat(path)
+        if not os.path.isfile(path):
+            raise IsADirectoryError(f'Not a file: {path}')
+        return st.st_size
+    try:
+        size = await asyncio.to_thread(stat)
+    except FileNotFoundError:
+        raise HTTPException(404, f'File not found: {path}')
+    except PermissionError as e:
+        raise HTTPException(403, str(e))
+    except (IsADirectoryError, OSError) as e:
+        raise HTTPException(400, str(e))
+    status, headers = 200, {'Accept-Ranges': 'bytes'}
+    range_header = request.headers.get('range', '')
+    if range_header.startswith('bytes=') and ',' not in range_header:
+        first, _, last = range_header[6:].strip().partition('-')
+        if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+            raise HTTPException(400, f'Malformed Range header: {range_header}')
+        if first:
+            offset = int(first)
+            if last and int(last) < offset:
+                return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+            length = (int(last) + 1 - offset) if last else None
+        else:  # suffix range: the last N bytes
+            offset = max(size - int(last), 0)
+            length = None
+        if offset >= size:
+            return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+        end = size if length is None else min(offset + length, size)
+        status = 206
+        headers['Content-Range'] = f'bytes {offset}-{end - 1}/{size}'
+    # Sync generator: Starlette iterates it in a worker thread
+    return StreamingResponse(file_mgr.iter_bytes(path, offset, length), status_code=status,
+                             headers=headers,
+                             media_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
 
 @app.post("/system/write")
 async def system_write(body: dict):
@@ -44,9 +111,35 @@ async def system_write(body: dict):
 async def system_delete(body: dict):
     return file_mgr.delete(body['path'])
 
+@app.post("/system/search")
+async def system_search(body: dict):
+    # Runs off the event loop; content is scanned on FileManager's thread pool
+    return await asyncio.to_thread(
+        file_mgr.search, body['root'], body.get('pattern', '*'), body.get('content_search'),
+        body.get('regex', False), body.get('case_sensitive', False), body.get('max_results', 100))
+
 @app.post("/system/run")
 async def system_run(body: dict):
     import dataclasses
+    if body.get('session'):
+        # Reuse the workspace's persistent shell: cwd, env and venv carry over
+        for attempt in range(2):
+            try:
+                shell = await get_shell_sessions().get_or_create(body.get('cwd') or os.getcwd())
+            except (RuntimeError, ValueError) as e:
+                return {'command': body['command'], 'stdout': '', 'stderr': str(e),
+                        'return_code': -1, 'success': False, 'duration_ms': 0.0}
+            try:
+                result = await shell.run(body['command'], body.get('timeout', 30.0))
+                break
+            except (RuntimeError, OSError) as e:
+                # The shell exited before the command was sent; get_or_create
+                # replaces a closed session, so try once more with a new one.
+                if attempt:
+                    raise HTTPException(410, f'Shell session exited: {e}')
+        return {'command': result['command'], 'stdout': result['output'], 'stderr': '',
+                'return_code': result['return_code'], 'success': result['success'],
+                'duration_ms': result['duration_ms'], 'session_id': shell.id}
     result = await file_mgr.run(body['command'], body.get('cwd'), body.get('timeout', 30.0))
     return dataclasses.asdict(result)
 
@@ -54,16 +147,178 @@ async def system_run(body: dict):
 async def system_drives():
     return file_mgr.get_drives()
 
+@app.get("/system/http_pools")
+async def system_http_pools():
+    return get_clients().stats()
+
+@app.get("/system/provider_latency")
+async def system_provider_latency():
+    return latency_stats()
+
+@app.get("/system/generation_cache")
+async def system_generation_cache():
+    return get_generation_cache().stats()
+
+@app.delete("/system/generation_cache")
+async def system_generation_cache_clear():
+    get_generation_cache().clear()
+    return {"ok": True}
+
+MAX_RUNS_PER_SOCKET = 8
+
 @app.websocket("/ws/run")
 async def ws_run(websocket: WebSocket):
+    """Run commands over one socket, several at a time.
+
+    Send {'type': 'run', 'id', 'command', 'cwd'} to start a command and
+    {'type': 'cancel', 'id'} to kill it; every frame sent back carries the
+    command's id. A bare {'command': ...} message is treated as a run.
+    """
     await websocket.accept()
+    runs: dict[str, asyncio.Task] = {}
+    send_lock = asyncio.Lock()
+
+    async def send(evt: dict):
+        # Sends from concurrent runs must not interleave; a slow client
+        # blocks here, which backs up into run_stream's bounded queue.
+        async with send_lock:
+            await websocket.send_json(evt)
+
+    async def run(run_id: str, command: str, cwd: str | None):
+        try:
+            async for evt in file_mgr.run_stream(command, cwd):
+                await send({**evt, 'id': run_id})
+        except asyncio.CancelledError:
+            await send({'type': 'cancelled', 'id': run_id})
+            raise
+        except Exception as e:
+            await send({'type': 'error', 'id': run_id, 'message': str(e)})
+        finally:
+            runs.pop(run_id, None)
+
     try:
         while True:
             data = await websocket.receive_json()
-            async for evt in file_mgr.run_stream(data['command'], data.get('cwd')):
-                await websocket.send_json(evt)
+            kind = data.get('type', 'run')
+            run_id = str(data.get('id') or uuid.uuid4())
+            if kind == 'cancel':
+                task = runs.get(run_id)
+                if task:
+                    task.cancel()
+            elif kind == 'run':
+                if run_id in runs:
+                    await send({'type': 'error', 'id': run_id, 'message': 'Run id already in use'})
+                elif len(runs) >= MAX_RUNS_PER_SOCKET:
+                    await send({'type': 'error', 'id': run_id,
+                                'message': f'Too many concurrent runs (max {MAX_RUNS_PER_SOCKET})'})
+                else:
+                    runs[run_id] = asyncio.create_task(run(run_id, data['command'], data.get('cwd')))
+            else:
+                await send({'type': 'error', 'message': f'Unknown type: {kind}'})
     except WebSocketDisconnect:
         pass
+    finally:
+        for task in list(runs.values()):
+            task.cancel()
+
+@app.websocket("/ws/search")
+async def ws_search(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            count = 0
+            try:
+                async for entry in file_mgr.search_stream(
+                        data['root'], data.get('pattern', '*'), data.get('content_search'),
+                        data.get('regex', False), data.get('case_sensitive', False),
+                        data.get('max_results', 1000)):
+                    count += 1
+                    await websocket.send_json({'type': 'match', **entry})
+            except (ValueError, PermissionError, OSError) as e:
+                await websocket.send_json({'type': 'error', 'message': str(e)})
+                continue
+            await websocket.send_json({'type': 'done', 'count': count})
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/system/shell/sessions")
+async def system_shell_sessions():
+    return get_shell_sessions().list()
+
+@app.delete("/system/shell/{session_id}")
+async def system_shell_close(session_id: str):
+    return {"ok": await get_shell_sessions().close(session_id)}
+
+@app.websocket("/ws/shell")
+async def ws_shell(websocket: WebSocket, workspace: str, since: int = 0):
+    """Attach to the workspace's persistent shell.
+
+    Output frames carry the byte offset after their data; reconnect with
+    since=<last offset> to replay what was missed from the session's ring
+    buffer. Client messages: {'type': 'input', 'data'}, {'type': 'resize',
+    'rows', 'cols'} and {'type': 'run', 'id', 'command', 'timeout'}.
+    """
+    import codecs
+    await websocket.accept()
+    try:
+        shell = await get_shell_sessions().get_or_create(workspace)
+    except (RuntimeError, ValueError) as e:
+        await websocket.send_json({'type': 'error', 'message': str(e)})
+        await websocket.close()
+        return
+    shell.clients += 1
+    await websocket.send_json({'type': 'session', **shell.info()})
+    send_lock = asyncio.Lock()
+
+    async def send(evt: dict):
+        async with send_lock:
+            await websocket.send_json(evt)
+
+    async def forward():
+        decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        offset = since
+        while not shell.closed or offset < shell.offset:
+            await shell.wait(offset)
+            start, data = shell.read(offset)
+            if start > offset:
+                await send({'type': 'truncated', 'missed': start - offset})
+            if data:
+                offset = start + len(data)
+                await send({'type': 'output', 'data': decoder.decode(data), 'offset': offset})
+        await send({'type': 'exit'})
+
+    async def run(run_id, command, timeout):
+        result = await shell.run(command, timeout)
+        await send({'type': 'result', 'id': run_id, **result})
+
+    forwarder = asyncio.create_task(forward())
+    runs = set()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            kind = data.get('type')
+            try:
+                if kind == 'input':
+                    shell.write(data['data'])
+                elif kind == 'resize':
+                    shell.resize(int(data['rows']), int(data['cols']))
+                elif kind == 'run':
+                    task = asyncio.create_task(run(data.get('id'), data['command'], data.get('timeout', 30.0)))
+                    runs.add(task)
+                    task.add_done_callback(runs.discard)
+                else:
+                    await send({'type': 'error', 'message': f'Unknown type: {kind}'})
+            except (RuntimeError, OSError) as e:
+                await send({'type': 'error', 'message': str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        shell.clients -= 1
+        shell.last_active = time.monotonic()
+        forwarder.cancel()
+        for task in runs:
+            task.cancel()
 
 # Workspace endpoints
 @app.post("/workspace/open")
@@ -99,6 +354,8 @@ async def generation_websocket(websocket: WebSocket):
     except WebSocketDisconnect:
         pass
 
+app.include_router(ast_router)
+
 # Include MCP router - MUST be after all other routes to avoid conflicts
 app.include_router(mcp_router)
 
@@ -1,7 +1,7 @@
 ﻿# backend/src/model_router.py (cloud version)
 import os
-import httpx
 from typing import AsyncGenerator
+from src.core.http_pool import get_client
 
 class ModelRouter:
     def __init__(self):
@@ -16,20 +16,20 @@ class ModelRouter:
             "stream": stream,
             "max_tokens": 2000
         }
-        async with httpx.AsyncClient() as client:
-            if stream:
-                async with client.stream("https://api.deepseek.com/v1/chat/completions", headers=headers, json=data) as resp:
-                    async for line in resp.aiter_lines():
-                        if line.startswith("data: "):
-                            chunk = line[6:]
-                            if chunk != "[DONE]":
-                                import json
-                                try:
-                                    delta = json.loads(chunk)["choices"][0]["delta"].get("content")
-                                    if delta:
-                                        yield delta
-                                except:
-                                    pass
-            else:
-                resp = await client.post("https://api.deepseek.com/v1/chat/completions", headers=headers, json=data)
-                yield resp.json()["choices"][0]["message"]["content"]
+        client = get_client("deepseek")
+        if stream:
+            async with client.stream("POST", self.base_url, headers=headers, json=data) as resp:
+                async for line in resp.aiter_lines():
+                    if line.startswith("data: "):
+                        chunk = line[6:]
+                        if chunk != "[DONE]":
+                            import json
+                            try:
+                                delta = json.loads(chunk)["choices"][0]["delta"].get("content")
+                                if delta:
+                                    yield delta
+                            except:
+                                pass
+        else:
+            resp = await client.post(self.base_url, headers=headers, json=data)
+            yield resp.json()["choices"][0]["message"]["content"]
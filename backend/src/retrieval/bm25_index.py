@@ -1,80 +1,370 @@
 ﻿# backend/src/retrieval/bm25_index.py
 import os
-from pathlib import Path
-from rank_bm25 import BM25Okapi
-import json
+import re
+import math
+import heapq
+import sqlite3
 import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-import threading
+from src.retrieval.hybrid_rag import CodeChunk
+from src.system.fs_walk import SKIP_DIRS, walk_files
+try:
+    from src.ast.parser import get_ast_parser
+except ImportError:  # tree-sitter grammars not installed: fixed-size chunks only
+    get_ast_parser = None
+
+logger = logging.getLogger('bm25_index')
+
+INDEXED_SUFFIXES = {".py", ".js", ".ts", ".jsx", ".tsx", ".html", ".css", ".json"}
+TOKEN_RE = re.compile(r'\b[a-zA-Z0-9_]+\b')
+K1 = 1.5
+B = 0.75
+# Functions/classes longer than this are split into their members, and
+# code outside any definition is cut into windows of this many lines.
+MAX_CHUNK_LINES = 120
+# Bump when the chunking changes so existing indexes are rebuilt.
+INDEX_VERSION = 2
+
+class _WatchHandler(FileSystemEventHandler):
+    def __init__(self, index: "BM25Index"):
+        self.index = index
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.index.update_file(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.index.update_file(event.src_path)
+
+    def on_deleted(self, event):
+        if event.is_directory:
+            self.index.remove_dir(event.src_path)
+        else:
+            self.index.remove_file(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            self.index.remove_dir(event.src_path)
+            for entry in walk_files(event.dest_path, suffixes=INDEXED_SUFFIXES):
+                self.index.update_file(entry.path)
+        else:
+            self.index.remove_file(event.src_path)
+            self.index.update_file(event.dest_path)
 
 class BM25Index:
-    def __init__(self, workspace_path: str = "./workspace", index_path: str = "./backend/.bm25_index.json"):
+    """On-disk inverted index scored with BM25.
+
+    Postings (term, doc, tf) and document lengths live in SQLite, so startup
+    only opens the database and a search reads just the postings of its query
+    terms. Files are re-indexed one at a time as they change, either through
+    sync() or the watchdog observer started by watch().
+    """
+    def __init__(self, workspace_path: str = "./workspace", index_path: str = "./backend/.bm25_index.db"):
         self.workspace_path = Path(workspace_path)
         self.index_path = Path(index_path)
-        self.index = None
-        self.files = []  # list of (file_path, content)
-        self._build()
+        self._root = self.workspace_path.resolve()
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._observer = None
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA mmap_size=268435456")
+        self._init_db()
+        if self._count_docs() == 0:
+            self.sync()
 
     def _tokenize(self, text: str):
         # Simple tokenizer: split on non-alphanumeric, lowercase
-        import re
-        tokens = re.findall(r'\b[a-zA-Z0-9_]+\b', text.lower())
-        return tokens
+        return TOKEN_RE.findall(text.lower())
+
+    def _init_db(self):
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    hash TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS docs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    path TEXT NOT NULL,
+                    start_line INTEGER NOT NULL,
+                    end_line INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    hash TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_docs_path ON docs(path);
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, doc_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(doc_id);
+            """)
+            if self._conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                self._conn.executescript("DROP TABLE postings; DROP TABLE docs; DROP TABLE files;")
+                self._conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+                self._init_db()
+
+    def _count_docs(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def _rel(self, path) -> str | None:
+        p = Path(path)
+        try:
+            rel = p.resolve().relative_to(self._root)
+        except ValueError:
+            return None
+        if p.suffix not in INDEXED_SUFFIXES or any(part in SKIP_DIRS for part in rel.parts):
+            return None
+        return rel.as_posix()
+
+    def _spans(self, path: str, content: str):
+        """Function and class line spans from ASTParser, outermost first."""
+        if get_ast_parser is None:
+            return []
+        try:
+            summary = get_ast_parser().parse_file(path, content)
+        except Exception as e:
+            logger.debug(f'AST parse failed for {path}: {e}')
+            return []
+        spans = [(f["start_line"], f["end_line"]) for f in summary.get("functions", [])]
+        spans += [(c["start_line"], c["end_line"]) for c in summary.get("classes", [])]
+        return sorted(set(spans), key=lambda s: (s[0], -s[1]))
 
-    def _build(self):
-        if self.index_path.exists():
+    def _split(self, path: str, content: str):
+        """Yield (start_line, end_line, text) documents for one file.
+
+        Each top-level function or class is one document; oversized ones are
+        replaced by their nested definitions. Lines outside every definition
+        (imports, module code) become window documents.
+        """
+        lines = content.splitlines()
+        spans = self._spans(path, content)
+        chunks = []
+        for start, end in spans:
+            if chunks and end <= chunks[-1][1]:
+                continue
+            if end - start + 1 > MAX_CHUNK_LINES and any(
+                    start <= s and e <= end and (s, e) != (start, end) for s, e in spans):
+                continue
+            chunks.append((start, end))
+        line = 1
+        for start, end in chunks + [(len(lines) + 1, len(lines))]:
+            for w in range(line, start, MAX_CHUNK_LINES):
+                w_end = min(start - 1, w + MAX_CHUNK_LINES - 1)
+                text = "\n".join(lines[w - 1:w_end])
+                if text.strip():
+                    yield w, w_end, text
+            if start <= end:
+                yield start, end, "\n".join(lines[start - 1:end])
+            line = max(line, end + 1)
+
+    def _drop(self, rel: str):
+        ids = [r[0] for r in self._conn.execute("SELECT id FROM docs WHERE path = ?", (rel,))]
+        self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", [(i,) for i in ids])
+        self._conn.execute("DELETE FROM docs WHERE path = ?", (rel,))
+        self._conn.execute("DELETE FROM files WHERE path = ?", (rel,))
+
+    def update_file(self, path) -> bool:
+        """Re-index one file if its content changed; returns True if it did."""
+        rel = self._rel(path)
+        if rel is None:
+            return False
+        fp = self.workspace_path / rel
+        try:
+            mtime = fp.stat().st_mtime
+            content = fp.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            self.remove_file(path)
+            return False
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT hash FROM files WHERE path = ?", (rel,)).fetchone()
+            if row and row[0] == digest:
+                self._conn.execute("UPDATE files SET mtime = ? WHERE path = ?", (mtime, rel))
+                return False
+            self._drop(rel)
+            self._conn.execute("INSERT INTO files (path, mtime, hash) VALUES (?, ?, ?)",
+                               (rel, mtime, digest))
+            for start, end, text in self._split(rel, content):
+                tokens = self._tokenize(text)
+                cur = self._conn.execute(
+                    "INSERT INTO docs (path, start_line, end_line, length, hash) VALUES (?, ?, ?, ?, ?)",
+                    (rel, start, end, len(tokens), hashlib.sha1(text.encode("utf-8")).hexdigest()))
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, cur.lastrowid, tf) for term, tf in Counter(tokens).items()])
+        return True
+
+    def remove_file(self, path):
+        rel = self._rel(path)
+        if rel is None:
+            return
+        with self._lock, self._conn:
+            self._drop(rel)
+
+    def remove_dir(self, path):
+        """Drop every indexed file under a directory that was removed or moved away."""
+        try:
+            rel = Path(path).resolve().relative_to(self._root).as_posix()
+        except ValueError:
+            return
+        prefix = "" if rel == "." else rel + "/"
+        with self._lock, self._conn:
+            for (file_rel,) in self._conn.execute("SELECT path FROM files").fetchall():
+                if file_rel.startswith(prefix):
+                    self._drop(file_rel)
+
+    def _walk(self):
+        for entry in walk_files(self.workspace_path, suffixes=INDEXED_SUFFIXES):
+            yield entry.path
+
+    def sync(self) -> dict:
+        """Bring the index in line with the workspace, touching only changed files."""
+        with self._lock:
+            known = dict(self._conn.execute("SELECT path, mtime FROM files"))
+        seen, updated = set(), 0
+        for path in self._walk():
+            rel = self._rel(path)
+            if rel is None:
+                continue
+            seen.add(rel)
             try:
-                with open(self.index_path, "r") as f:
-                    data = json.load(f)
-                    self.files = data["files"]
-                    tokenized_corpus = [self._tokenize(content) for _, content in self.files]
-                    self.index = BM25Okapi(tokenized_corpus)
-                return
-            except:
-                pass
-        self.files = []
-        for filepath in self.workspace_path.rglob("*"):
-            if filepath.is_file() and filepath.suffix in [".py", ".js", ".ts", ".jsx", ".tsx", ".html", ".css", ".json"]:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if known.get(rel) != mtime and self.update_file(path):
+                updated += 1
+        removed = [rel for rel in known if rel not in seen]
+        with self._lock, self._conn:
+            for rel in removed:
+                self._drop(rel)
+        return {"updated": updated, "removed": len(removed), "files": len(seen)}
+
+    def rebuild(self) -> dict:
+        with self._lock, self._conn:
+            self._conn.executescript("DELETE FROM postings; DELETE FROM docs; DELETE FROM files;")
+        return self.sync()
+
+    def top_docs(self, query: str, top_k: int) -> List[tuple]:
+        """Best (doc_id, score) pairs for a query, highest first."""
+        terms = set(self._tokenize(query))
+        with self._lock:
+            n, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            if not n or not terms:
+                return []
+            avgdl = total / n
+            scores = {}
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id "
+                    "WHERE p.term = ?", (term,)).fetchall()
+                if not rows:
+                    continue
+                idf = math.log((n - len(rows) + 0.5) / (len(rows) + 0.5) + 1)
+                for doc_id, tf, length in rows:
+                    denom = tf + K1 * (1 - B + B * length / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / denom
+        return heapq.nlargest(top_k, scores.items(), key=lambda kv: kv[1])
+
+    def docs(self) -> List[tuple]:
+        """(doc_id, path, start_line, end_line, hash) for every indexed chunk."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, path, start_line, end_line, hash FROM docs").fetchall()
+
+    def iter_chunks(self, scored: List[tuple], source: str = "bm25"):
+        """Yield (doc_id, CodeChunk) for (doc_id, score) pairs, reading each file once."""
+        with self._lock:
+            meta = {}
+            for doc_id, _ in scored:
+                meta[doc_id] = self._conn.execute(
+                    "SELECT path, start_line, end_line FROM docs WHERE id = ?", (doc_id,)).fetchone()
+        lines = {}
+        for doc_id, score in scored:
+            if meta[doc_id] is None:
+                continue
+            file_path, start, end = meta[doc_id]
+            if file_path not in lines:
                 try:
-                    with open(filepath, "r", encoding="utf-8") as f:
-                        content = f.read()
-                    self.files.append((str(filepath.relative_to(self.workspace_path)), content))
-                except:
-                    pass
-        tokenized_corpus = [self._tokenize(content) for _, content in self.files]
-        self.index = BM25Okapi(tokenized_corpus)
-        # Save to disk
-        with open(self.index_path, "w") as f:
-            json.dump({"files": self.files}, f)
-
-    def search(self, query: str, top_k: int = 5):
-        tokenized_query = self._tokenize(query)
-        scores = self.index.get_scores(tokenized_query)
-        # Get top_k indices
-        top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-        results = []
-        for idx in top_indices:
-            file_path, content = self.files[idx]
-            # extract a snippet
-            lines = content.splitlines()
-            snippet = "\n".join(lines[:10]) + ("..." if len(lines) > 10 else "")
-            results.append({
-                "file": file_path,
-                "score": float(scores[idx]),
-                "snippet": snippet,
-                "source": "bm25"
-            })
-        return results
+                    lines[file_path] = (self.workspace_path / file_path).read_text(encoding="utf-8").splitlines()
+                except (OSError, UnicodeDecodeError):
+                    lines[file_path] = None
+            if lines[file_path] is None:
+                continue
+            yield doc_id, CodeChunk(
+                file_path=file_path,
+                content="\n".join(lines[file_path][start - 1:end]),
+                start_line=start,
+                end_line=end,
+                score=float(score),
+                source=source
+            )
+
+    def load_chunks(self, scored: List[tuple], source: str = "bm25") -> List[CodeChunk]:
+        return [chunk for _, chunk in self.iter_chunks(scored, source)]
+
+    def search(self, query: str, top_k: int = 5) -> List[CodeChunk]:
+        return self.load_chunks(self.top_docs(query, top_k))
 
     def watch(self):
-        # For simplicity, we'll not implement dynamic watching; user can rebuild manually.
-        pass
-
-# Singleton instance
-_bm25 = None
-def get_bm25():
-    global _bm25
-    if _bm25 is None:
-        _bm25 = BM25Index()
-    return _bm25
+        """Start a watchdog observer that re-indexes files as they change."""
+        if self._observer is not None:
+            return
+        self.workspace_path.mkdir(parents=True, exist_ok=True)
+        self._observer = Observer()
+        self._observer.schedule(_WatchHandler(self), str(self.workspace_path), recursive=True)
+        self._observer.daemon = True
+        self._observer.start()
+        # Pick up anything that changed while nobody was watching.
+        threading.Thread(target=self.sync, daemon=True).start()
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+# One index per workspace; the default workspace keeps the original db path
+DEFAULT_WORKSPACE = "./workspace"
+_indexes = {}  # workspace -> Future[BM25Index]
+_indexes_lock = threading.Lock()
+def get_bm25(workspace_path: str = None) -> BM25Index:
+    """Shared index for a workspace. Blocks while it is first built: call off the event loop.
+
+    The global lock only guards the registry; the build (which may run a
+    full sync) happens outside it, and concurrent callers for the same
+    workspace wait on its future.
+    """
+    key = os.path.abspath(workspace_path or DEFAULT_WORKSPACE)
+    with _indexes_lock:
+        future = _indexes.get(key)
+        owner = future is None
+        if owner:
+            future = _indexes[key] = Future()
+    if owner:
+        try:
+            if workspace_path is None or key == os.path.abspath(DEFAULT_WORKSPACE):
+                index = BM25Index(DEFAULT_WORKSPACE)
+            else:
+                digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+                index = BM25Index(key, f"./backend/.bm25/{digest}.db")
+            index.watch()
+        except BaseException as e:
+            with _indexes_lock:
+                _indexes.pop(key, None)  # let the next caller retry
+            future.set_exception(e)
+            raise
+        future.set_result(index)
+    return future.result()
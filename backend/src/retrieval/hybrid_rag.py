@@ -1,7 +1,26 @@
-﻿# backend/src/retrieval/hybrid_rag.py (stub)
-from typing import List
+﻿# backend/src/retrieval/hybrid_rag.py
+import os
+import asyncio
+import heapq
+import time
+import sqlite3
+import logging
+import threading
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
 from dataclasses import dataclass
 
+logger = logging.getLogger('hybrid_rag')
+
+EMBED_MODEL = os.getenv("RETRIEVAL_EMBED_MODEL", "nomic-embed-text")
+RRF_K = 60                 # reciprocal-rank fusion constant
+CANDIDATES = 50            # per-retriever candidates fed into the fusion
+CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "6000"))
+EMBED_CONCURRENCY = 4
+EMBED_BATCH = 256          # new chunks embedded per refresh
+DENSE_RETRY_AFTER = 300.0  # seconds to skip the dense side after a failure
+
 @dataclass
 class CodeChunk:
     file_path: str
@@ -11,9 +30,220 @@ class CodeChunk:
     score: float
     source: str
 
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+class DenseIndex:
+    """Normalized embedding matrix over the BM25 chunks.
+
+    Embeddings are stored in SQLite keyed by chunk content hash, so an
+    unchanged chunk keeps its vector when its file is re-indexed. refresh()
+    embeds only chunks that are new since the last call.
+    """
+    def __init__(self, index_path: str = "./backend/.dense_index.db", model: str = EMBED_MODEL):
+        self.index_path = Path(index_path)
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    vec BLOB NOT NULL,
+                    PRIMARY KEY (hash, model)
+                )
+            """)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.doc_ids = np.zeros(0, dtype=np.int64)
+        self._docs_key = None
+        self._matrix_key = None  # (doc_id, hash) pairs the matrix was built from
+        self._vectors: Optional[Dict[str, np.ndarray]] = None  # hash -> vector, loaded once
+        self.pending = 0  # chunks that still have no embedding
+
+    def _stored(self) -> Dict[str, np.ndarray]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT hash, vec FROM embeddings WHERE model = ?", (self.model,)).fetchall()
+        return {h: np.frombuffer(v, dtype=np.float32) for h, v in rows}
+
+    def _store(self, items: List[tuple]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (hash, model, vec) VALUES (?, ?, ?)",
+                [(h, self.model, v.astype(np.float32).tobytes()) for h, v in items])
+        if self._vectors is not None:
+            self._vectors.update(items)
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        from src.core.ollama_client import get_ollama
+        vec = await get_ollama().embed(self.model, text)
+        return np.asarray(vec, dtype=np.float32) if vec else None
+
+    async def refresh(self, bm25, embed: bool = True) -> None:
+        """Rebuild the matrix from stored vectors; with embed, first embed one batch of new chunks."""
+        docs = await asyncio.to_thread(bm25.docs)
+        key = frozenset((d[0], d[4]) for d in docs)
+        if key == self._docs_key:
+            return
+        if self._vectors is None:
+            self._vectors = await asyncio.to_thread(self._stored)
+        stored = self._vectors
+        missing = {}
+        for doc_id, _, _, _, h in docs:
+            if h not in stored and h not in missing:
+                missing[h] = doc_id
+        self.pending = len(missing)
+        if not embed and missing:
+            key = None  # matrix is partial until the backlog is embedded
+        elif missing:
+            batch = list(missing.values())[:EMBED_BATCH]
+            pairs = await asyncio.to_thread(
+                lambda: list(bm25.iter_chunks([(i, 0.0) for i in batch])))
+            sem = asyncio.Semaphore(EMBED_CONCURRENCY)
+            by_id = {i: h for h, i in missing.items()}
+
+            async def one(doc_id, chunk):
+                async with sem:
+                    return by_id[doc_id], await self.embed(chunk.content)
+
+            new = [r for r in await asyncio.gather(*(one(i, c) for i, c in pairs))
+                   if r[1] is not None]
+            if new:
+                await asyncio.to_thread(self._store, new)
+            self.pending = len(missing) - len(new)
+            if len(missing) > len(batch):
+                # Finish the backlog on later calls instead of stalling this one.
+                key = None
+        embedded = [(doc_id, h) for doc_id, _, _, _, h in docs if h in stored]
+        matrix_key = frozenset(embedded)
+        self._docs_key = key
+        if matrix_key == self._matrix_key:
+            return  # backlog pending but nothing new embedded: keep the partial matrix
+        self._matrix_key = matrix_key
+        rows = [(doc_id, stored[h]) for doc_id, h in embedded]
+        if rows:
+            matrix = np.stack([v for _, v in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self.matrix = matrix / np.where(norms == 0, 1, norms)
+            self.doc_ids = np.array([d for d, _ in rows], dtype=np.int64)
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            self.doc_ids = np.zeros(0, dtype=np.int64)
+
+    def search(self, query_vec: np.ndarray, top_k: int) -> List[tuple]:
+        """Best (doc_id, cosine) pairs via one mat-vec product and argpartition."""
+        if not len(self.doc_ids) or query_vec.shape[0] != self.matrix.shape[1]:
+            return []
+        q = query_vec / (np.linalg.norm(query_vec) or 1)
+        sims = self.matrix @ q
+        k = min(top_k, len(sims))
+        idx = np.argpartition(-sims, k - 1)[:k]
+        idx = idx[np.argsort(-sims[idx])]
+        return [(int(self.doc_ids[i]), float(sims[i])) for i in idx]
+
 class HybridRetriever:
-    def retrieve(self, query: str, current_file: str = None, top_k: int = 8) -> List[CodeChunk]:
-        return []
+    """BM25 + embedding retrieval fused with reciprocal-rank fusion.
+
+    Each retriever contributes its CANDIDATES best chunks (both already come
+    from bounded top-k selection); chunks are scored by sum(1 / (RRF_K + rank))
+    and the top_k are kept with a heap. If the embedding model is unavailable
+    the dense side is skipped and results are plain BM25.
+    """
+    def __init__(self, bm25=None, dense: DenseIndex = None, workspace_path: str = None):
+        self._bm25 = bm25
+        self._dense = dense
+        self.workspace_path = workspace_path
+        self._dense_failed_at = None
+        self._backfill: Optional[asyncio.Task] = None
+
+    @property
+    def bm25(self):
+        if self._bm25 is None:
+            from src.retrieval.bm25_index import get_bm25
+            self._bm25 = get_bm25(self.workspace_path)
+        return self._bm25
+
+    @property
+    def dense(self) -> DenseIndex:
+        if self._dense is None:
+            self._dense = DenseIndex()
+        return self._dense
+
+    async def _dense_candidates(self, query: str) -> List[tuple]:
+        if self._dense_failed_at and time.monotonic() - self._dense_failed_at < DENSE_RETRY_AFTER:
+            return []
+        try:
+            # Only stored vectors are used here; new chunks are embedded in the
+            # background so a query never waits on a batch of embeddings.
+            await self.dense.refresh(self.bm25, embed=False)
+            if self.dense.pending and (self._backfill is None or self._backfill.done()):
+                self._backfill = asyncio.create_task(self._embed_backlog())
+            qvec = await self.dense.embed(query)
+        except Exception as e:
+            logger.warning(f'Dense retrieval unavailable, using BM25 only: {e}')
+            self._dense_failed_at = time.monotonic()
+            return []
+        self._dense_failed_at = None
+        return self.dense.search(qvec, CANDIDATES) if qvec is not None else []
+
+    async def _embed_backlog(self) -> None:
+        try:
+            while self.dense.pending:
+                before = self.dense.pending
+                await self.dense.refresh(self.bm25)
+                if self.dense.pending >= before:
+                    break
+        except Exception as e:
+            logger.warning(f'Embedding backlog paused: {e}')
+            self._dense_failed_at = time.monotonic()
+
+    async def retrieve(self, query: str, current_file: str = None, top_k: int = 8) -> List[CodeChunk]:
+        bm25 = await asyncio.to_thread(lambda: self.bm25)
+        sparse, dense = await asyncio.gather(
+            asyncio.to_thread(bm25.top_docs, query, CANDIDATES),
+            self._dense_candidates(query))
+        fused: Dict[int, float] = {}
+        sources: Dict[int, set] = {}
+        for name, ranked in (("bm25", sparse), ("dense", dense)):
+            for rank, (doc_id, _) in enumerate(ranked):
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+                sources.setdefault(doc_id, set()).add(name)
+        top = heapq.nlargest(top_k, fused.items(), key=lambda kv: kv[1])
+        pairs = await asyncio.to_thread(lambda: list(bm25.iter_chunks(top)))
+        chunks = []
+        for doc_id, chunk in pairs:
+            chunk.source = "+".join(sorted(sources[doc_id]))
+            chunks.append(chunk)
+        if current_file:
+            # Keep the file being edited first, then its import neighbours from
+            # the shared code graph; they are the most likely context.
+            from src.core.graph_utils import get_graph_query
+            query = get_graph_query()
+            near = set()
+            if query is not None and current_file in query.graph:
+                near = set(query.get_dependencies(current_file)) | set(query.get_dependents(current_file))
+            chunks.sort(key=lambda c: (c.file_path != current_file, c.file_path not in near))
+        return chunks
+
+    def build_context_string(self, chunks: List[CodeChunk], max_tokens: int = CONTEXT_TOKENS) -> str:
+        """Pack chunks in rank order under a token budget, skipping ones that don't fit."""
+        parts, used = [], 0
+        for c in chunks:
+            block = f"# {c.file_path}:{c.start_line}-{c.end_line}\n```\n{c.content}\n```"
+            cost = estimate_tokens(block)
+            if used + cost > max_tokens:
+                continue
+            parts.append(block)
+            used += cost
+        return "\n\n".join(parts)
 
-    def build_context_string(self, chunks: List[CodeChunk]) -> str:
-        return ""
+# One retriever per workspace
+_retrievers: Dict[str, HybridRetriever] = {}
+def get_retriever(workspace_path: str = None) -> HybridRetriever:
+    key = os.path.abspath(workspace_path) if workspace_path else None
+    retriever = _retrievers.get(key)
+    if retriever is None:
+        retriever = _retrievers[key] = HybridRetriever(workspace_path=workspace_path)
+    return retriever
@@ -1,5 +1,5 @@
 ﻿# backend/src/security/fix_suggester.py
-import ollama
+from src.core.ollama_client import get_ollama
 import re
 from typing import Dict
 
@@ -18,7 +18,7 @@ Original code snippet:
 ```{code}```
 
 Write a corrected version of the code that fixes this vulnerability. Output only the fixed code, no explanations."""
-        response = ollama.generate(model=self.model, prompt=prompt)
+        response = await get_ollama().generate(model=self.model, prompt=prompt)
         fixed = response.get('response', code)
         return fixed
 
@@ -7,12 +7,36 @@ import time
 import shutil
 import fnmatch
 import platform
+import signal
+import re
+import mmap
+import bisect
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import AsyncGenerator, List, Dict, Optional
+from typing import AsyncGenerator, Iterator, List, Dict, Optional
+from src.system.fs_walk import SKIP_DIRS, walk_files
 
 logger = logging.getLogger('file_manager')
 
+SEARCH_WORKERS = min(16, (os.cpu_count() or 1) + 4)
+SEARCH_INFLIGHT = SEARCH_WORKERS * 4  # files queued for content scanning at once
+BINARY_SNIFF_BYTES = 8192  # a NUL byte in this prefix marks the file as binary
+MAX_MATCHES_PER_FILE = 100
+ENCODING_SAMPLE_BYTES = 65536
+STREAM_CHUNK_BYTES = 256 * 1024
+LINE_CHUNK = 1024 * 1024  # newline-count checkpoint spacing for line-range reads
+LINE_INDEX_FILES = 32  # files whose line checkpoints are kept
+DIR_CACHE_SIZE = 512  # directory listings kept for browsing
+DIR_PAGE_SIZE = 500
+RUN_BATCH_INTERVAL = 0.05  # seconds of command output collected into one frame
+RUN_BATCH_BYTES = 16384
+RUN_QUEUE_LINES = 2000  # buffered lines before the pipes stop being drained
+RUN_LINE_LIMIT = 1024 * 1024
+
 @dataclass
 class FileNode:
     path: str
@@ -24,6 +48,28 @@ class FileNode:
     children: list = field(default_factory=list)
     is_readable: bool = True
 
+class DirEntryNode:
+    """One directory entry as returned by list_dir; slotted since listings can be huge."""
+    __slots__ = ('path', 'name', 'type', 'size', 'extension', 'last_modified', 'is_link')
+
+    def __init__(self, path: str, name: str, type: str, size: int,
+                 extension: str, last_modified: str, is_link: bool = False):
+        self.path = path
+        self.name = name
+        self.type = type
+        self.size = size
+        self.extension = extension
+        self.last_modified = last_modified
+        self.is_link = is_link
+
+    def sort_key(self) -> tuple:
+        # Directories first, then case-insensitive name
+        return (self.type == 'file', self.name.lower(), self.name)
+
+    def to_dict(self) -> dict:
+        return {'path': self.path, 'name': self.name, 'type': self.type, 'size': self.size,
+                'extension': self.extension, 'last_modified': self.last_modified}
+
 @dataclass
 class CommandResult:
     command: str
@@ -34,8 +80,7 @@ class CommandResult:
     duration_ms: float
 
 class FileManager:
-    SKIP_DIRS = {'node_modules', '.git', '__pycache__', 'venv', '.venv',
-                 'dist', 'build', '.next', 'target', 'vendor', '.idea', '.vscode'}
+    SKIP_DIRS = SKIP_DIRS
     BLOCKED_PATHS = [
         '/etc/shadow', '/etc/passwd', '/etc/sudoers',
         'C:\\Windows\\System32\\config', 'C:\\Windows\\System32\\drivers\\etc'
@@ -44,9 +89,19 @@ class FileManager:
 
     def __init__(self, allowed_roots: Optional[List[str]] = None):
         self.allowed_roots = allowed_roots
+        self._search_pool: Optional[ThreadPoolExecutor] = None
+        # (path, mtime_ns, size) -> [(offset, newlines before offset)], LRU order
+        self._line_index: OrderedDict = OrderedDict()
+        self._line_lock = threading.Lock()
+        # resolved dir path -> (mtime_ns, sorted entries, sort keys), LRU order
+        self._dir_cache: OrderedDict = OrderedDict()
+        self._dir_lock = threading.Lock()
 
     def _check(self, path: str) -> bool:
-        abs_path = str(Path(path).resolve())
+        return self._check_resolved(str(Path(path).resolve()), path)
+
+    def _check_resolved(self, abs_path: str, path: str = None) -> bool:
+        path = path or abs_path
         for blocked in self.BLOCKED_PATHS:
             if abs_path.startswith(blocked):
                 raise PermissionError(f'Access to {path} is blocked for safety')
@@ -55,56 +110,247 @@ class FileManager:
                 raise PermissionError(f'Path {path} is outside allowed roots')
         return True
 
+    def _listing(self, path: str) -> tuple[list, list]:
+        """Visible entries of a directory, sorted, cached until the directory's mtime changes.
+
+        A directory's mtime moves when entries are added, removed or renamed,
+        so a cache hit costs one stat; sizes and mtimes of files edited in
+        place may be stale until then.
+        """
+        real = os.path.realpath(path)
+        mtime = os.stat(real).st_mtime_ns
+        with self._dir_lock:
+            cached = self._dir_cache.get(real)
+            if cached and cached[0] == mtime:
+                self._dir_cache.move_to_end(real)
+                return cached[1], cached[2]
+        nodes = []
+        with os.scandir(real) as it:
+            for entry in it:
+                name = entry.name
+                if name.startswith('.') and name not in ('.env.example',):
+                    continue
+                if name in self.SKIP_DIRS:
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                    st = entry.stat()
+                    is_link = entry.is_symlink()
+                except OSError:
+                    continue
+                nodes.append(DirEntryNode(
+                    entry.path, name, 'directory' if is_dir else 'file', st.st_size,
+                    '' if is_dir else os.path.splitext(name)[1].lower(),
+                    str(st.st_mtime), is_link))
+        nodes.sort(key=DirEntryNode.sort_key)
+        keys = [n.sort_key() for n in nodes]
+        with self._dir_lock:
+            self._dir_cache[real] = (mtime, nodes, keys)
+            self._dir_cache.move_to_end(real)
+            while len(self._dir_cache) > DIR_CACHE_SIZE:
+                self._dir_cache.popitem(last=False)
+        return nodes, keys
+
+    def _visible(self, node: DirEntryNode) -> bool:
+        # Listing paths sit under an already resolved directory; only
+        # symlinks can point somewhere else and need a full resolve.
+        try:
+            if node.is_link:
+                return self._check(node.path)
+            return self._check_resolved(node.path)
+        except (PermissionError, OSError):
+            return False
+
+    def list_dir(self, path: str, cursor: str = None, limit: int = DIR_PAGE_SIZE) -> dict:
+        """One directory level, paged.
+
+        cursor is the next_cursor of the previous page; it names the last
+        entry returned, so paging stays consistent if entries are added or
+        removed in between.
+        """
+        self._check(path)
+        if not os.path.isdir(path):
+            raise NotADirectoryError(f'Not a directory: {path}')
+        nodes, keys = self._listing(path)
+        start = 0
+        if cursor:
+            kind, _, name = cursor.partition('/')
+            start = bisect.bisect_right(keys, (kind == 'f', name.lower(), name))
+        page, i = [], start
+        while i < len(nodes) and len(page) < limit:
+            if self._visible(nodes[i]):
+                page.append(nodes[i])
+            i += 1
+        next_cursor = None
+        if i < len(nodes) and page:
+            last = page[-1]
+            next_cursor = f"{'f' if last.type == 'file' else 'd'}/{last.name}"
+        return {'path': str(Path(path)), 'entries': [n.to_dict() for n in page],
+                'next_cursor': next_cursor, 'total': len(nodes)}
+
     def browse(self, path: str, max_depth: int = 3, _depth: int = 0) -> FileNode:
         self._check(path)
         p = Path(path)
         if not p.exists():
             raise FileNotFoundError(f'Path does not exist: {path}')
         stat = p.stat()
+        is_dir = p.is_dir()
         node = FileNode(
             path=str(p), name=p.name,
-            type='directory' if p.is_dir() else 'file',
+            type='directory' if is_dir else 'file',
             size=stat.st_size,
-            extension=p.suffix.lower() if p.is_file() else '',
+            extension=p.suffix.lower() if not is_dir else '',
             last_modified=str(stat.st_mtime),
         )
-        if p.is_dir() and _depth < max_depth:
-            try:
-                entries = sorted(p.iterdir(),
-                    key=lambda x: (x.is_file(), x.name.lower()))
-                for entry in entries:
-                    if entry.name.startswith('.') and entry.name not in ('.env.example',):
-                        continue
-                    if entry.name in self.SKIP_DIRS:
-                        continue
-                    try:
-                        node.children.append(self.browse(str(entry), max_depth, _depth+1))
-                    except (PermissionError, OSError):
-                        pass
-            except PermissionError:
-                node.is_readable = False
+        if is_dir and _depth < max_depth:
+            self._browse_children(node, max_depth, _depth + 1)
         return node
 
-    def read(self, path: str) -> dict:
+    def _browse_children(self, node: FileNode, max_depth: int, depth: int) -> None:
+        try:
+            entries, _ = self._listing(node.path)
+        except PermissionError:
+            node.is_readable = False
+            return
+        except OSError:
+            return
+        for entry in entries:
+            if not self._visible(entry):
+                continue
+            child = FileNode(path=entry.path, name=entry.name, type=entry.type, size=entry.size,
+                             extension=entry.extension, last_modified=entry.last_modified)
+            if entry.type == 'directory' and depth < max_depth:
+                self._browse_children(child, max_depth, depth + 1)
+            node.children.append(child)
+
+    @staticmethod
+    def detect_encoding(sample: bytes) -> str:
+        """Guess a file's encoding from its first bytes instead of decoding all of it."""
+        if sample.startswith(b'\xef\xbb\xbf'):
+            return 'utf-8-sig'
+        if sample.startswith((b'\xff\xfe', b'\xfe\xff')):
+            return 'utf-16'
+        if b'\0' in sample:
+            return 'base64'
+        try:
+            sample.decode('utf-8')
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut off by the end of the sample is still UTF-8
+            if e.start < len(sample) - 3:
+                return 'latin-1'
+        return 'utf-8'
+
+    def _decode(self, data: bytes, encoding: str) -> tuple[str, str]:
+        if encoding == 'base64':
+            return base64.b64encode(data).decode(), encoding
+        try:
+            return data.decode(encoding), encoding
+        except UnicodeDecodeError:
+            return data.decode('latin-1'), 'latin-1'
+
+    def _line_offset(self, mm: mmap.mmap, key: tuple, line: int) -> int:
+        """Byte offset where 1-based line starts (len(mm) if the file is shorter).
+
+        Keeps (offset, newlines before offset) checkpoints every LINE_CHUNK
+        bytes per file version, so seeking deep into a large file counts
+        newlines once and later requests resume from the nearest checkpoint.
+        """
+        if line <= 1:
+            return 0
+        with self._line_lock:
+            points = self._line_index.pop(key, None) or [(0, 0)]
+            self._line_index[key] = points
+            while len(self._line_index) > LINE_INDEX_FILES:
+                self._line_index.pop(next(iter(self._line_index)))
+        target = line - 1  # newlines that precede the line
+        i = bisect.bisect_left(points, target, key=lambda p: p[1]) - 1
+        offset, seen = points[max(i, 0)]
+        size = len(mm)
+        while offset < size:
+            end = min(offset + LINE_CHUNK, size)
+            count = mm[offset:end].count(b'\n')
+            if seen + count >= target:
+                pos = offset
+                while seen < target:
+                    pos = mm.find(b'\n', pos, end) + 1
+                    seen += 1
+                return pos
+            offset, seen = end, seen + count
+            if offset > points[-1][0]:
+                points.append((offset, seen))
+        return size
+
+    def read(self, path: str, offset: int = 0, length: int = None,
+             start_line: int = None, end_line: int = None) -> dict:
+        """Read a file, or a byte or line range of it.
+
+        Without a range the whole file is returned (up to MAX_FILE_MB). With
+        offset/length or start_line/end_line (1-based, inclusive) only that
+        slice is decoded from a memory map, so ranges of arbitrarily large
+        files can be read; the slice itself is capped at MAX_FILE_MB.
+        """
         self._check(path)
         p = Path(path)
-        size_mb = p.stat().st_size / 1024 / 1024
-        if size_mb > self.MAX_FILE_MB:
-            raise ValueError(f'File too large: {size_mb:.1f}MB (max {self.MAX_FILE_MB}MB)')
+        stat = p.stat()
+        size = stat.st_size
         mime, _ = mimetypes.guess_type(path)
-        try:
-            content = p.read_text(encoding='utf-8')
+        ranged = offset or length is not None or start_line is not None or end_line is not None
+        limit = self.MAX_FILE_MB * 1024 * 1024
+        if not ranged:
+            if size > limit:
+                raise ValueError(f'File too large: {size / 1024 / 1024:.1f}MB (max {self.MAX_FILE_MB}MB); '
+                                 f'request a byte or line range instead')
+            data = p.read_bytes()
+            content, encoding = self._decode(data, self.detect_encoding(data[:ENCODING_SAMPLE_BYTES]))
+            return {'content': content, 'encoding': encoding,
+                    'size_bytes': size,
+                    'mime_type': mime or 'text/plain'}
+        with open(p, 'rb') as f:
+            sample = f.read(ENCODING_SAMPLE_BYTES)
+            encoding = self.detect_encoding(sample)
+            if size == 0:
+                data, start, end = b'', 0, 0
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    key = (str(p.resolve()), stat.st_mtime_ns, size)
+                    if start_line is not None or end_line is not None:
+                        start = self._line_offset(mm, key, start_line or 1)
+                        end = self._line_offset(mm, key, end_line + 1) if end_line else size
+                    else:
+                        start = min(max(offset, 0), size)
+                        end = size if length is None else min(start + max(length, 0), size)
+                    end = min(end, start + limit)
+                    if encoding.startswith('utf-8'):
+                        # Don't split a multi-byte character at either edge
+                        while start < end and mm[start] & 0xC0 == 0x80:
+                            start += 1
+                        while end < size and end > start and mm[end] & 0xC0 == 0x80:
+                            end -= 1
+                    data = mm[start:end]
+        if encoding == 'utf-8-sig' and start > 0:
             encoding = 'utf-8'
-        except UnicodeDecodeError:
-            try:
-                content = p.read_text(encoding='latin-1')
-                encoding = 'latin-1'
-            except Exception:
-                content = base64.b64encode(p.read_bytes()).decode()
-                encoding = 'base64'
-        return {'content': content, 'encoding': encoding,
-                'size_bytes': p.stat().st_size,
-                'mime_type': mime or 'text/plain'}
+        content, encoding = self._decode(data, encoding)
+        result = {'content': content, 'encoding': encoding,
+                  'size_bytes': size,
+                  'mime_type': mime or 'text/plain',
+                  'offset': start, 'length': end - start, 'eof': end >= size}
+        if start_line is not None or end_line is not None:
+            result['start_line'] = start_line or 1
+        return result
+
+    def iter_bytes(self, path: str, offset: int = 0, length: int = None,
+                   chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+        """Yield a byte range of a file in chunks from a memory map, for streamed responses."""
+        self._check(path)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            start = min(max(offset, 0), size)
+            end = size if length is None else min(start + max(length, 0), size)
+            if start >= end:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for pos in range(start, end, chunk_size):
+                    yield mm[pos:min(pos + chunk_size, end)]
 
     def write(self, path: str, content: str, create_dirs: bool = True) -> dict:
         self._check(path)
@@ -128,34 +374,141 @@ class FileManager:
         shutil.move(src, dst)
         return {'success': True, 'src': src, 'dst': dst}
 
-    def search(self, root: str, pattern: str,
-               content_search: str = None) -> list[dict]:
-        self._check(root)
-        results = []
-        for p in Path(root).rglob('*'):
-            if any(part in self.SKIP_DIRS for part in p.parts):
-                continue
-            if not fnmatch.fnmatch(p.name, pattern):
-                continue
-            if not p.is_file():
-                continue
-            entry = {'path': str(p), 'name': p.name,
-                     'size': p.stat().st_size,
-                     'last_modified': str(p.stat().st_mtime),
-                     'match_lines': []}
-            if content_search:
-                try:
-                    lines = p.read_text(encoding='utf-8', errors='ignore').splitlines()
-                    entry['match_lines'] = [f'{i+1}: {l}' for i, l in enumerate(lines)
-                                            if content_search.lower() in l.lower()]
-                    if not entry['match_lines']:
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._search_pool is None:
+            self._search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS,
+                                                   thread_name_prefix='search')
+        return self._search_pool
+
+    @staticmethod
+    def compile_matcher(content_search: str, regex: bool = False,
+                        case_sensitive: bool = False) -> 're.Pattern[bytes]':
+        """Byte pattern for a content query; literal queries are escaped."""
+        needle = content_search.encode('utf-8')
+        if not regex:
+            needle = re.escape(needle)
+        try:
+            return re.compile(needle, 0 if case_sensitive else re.IGNORECASE)
+        except re.error as e:
+            raise ValueError(f'Invalid search pattern: {e}')
+
+    def _scan_file(self, dir_entry: os.DirEntry, matcher, stop: threading.Event) -> Optional[dict]:
+        try:
+            stat = dir_entry.stat()
+            if stat.st_size == 0:
+                return None
+            with open(dir_entry.path, 'rb') as f:
+                if b'\0' in f.read(BINARY_SNIFF_BYTES):
+                    return None  # binary
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    match_lines, line_no, pos, last_line = [], 1, 0, 0
+                    for m in matcher.finditer(mm):
+                        if stop.is_set():
+                            return None
+                        start = m.start()
+                        line_no += mm[pos:start].count(b'\n')
+                        pos = start
+                        if line_no == last_line:
+                            continue
+                        last_line = line_no
+                        line_start = mm.rfind(b'\n', 0, start) + 1
+                        line_end = mm.find(b'\n', start)
+                        line = mm[line_start:line_end if line_end != -1 else len(mm)]
+                        match_lines.append(f"{line_no}: {line.decode('utf-8', 'replace').rstrip()}")
+                        if len(match_lines) >= MAX_MATCHES_PER_FILE:
+                            break
+        except (OSError, ValueError):
+            return None
+        if not match_lines:
+            return None
+        return {'path': dir_entry.path, 'name': dir_entry.name,
+                'size': stat.st_size, 'last_modified': str(stat.st_mtime),
+                'match_lines': match_lines}
+
+    def _iter_search(self, root: str, pattern: str, matcher,
+                     stop: threading.Event) -> Iterator[dict]:
+        """Blocking search: walk on the calling thread, scan file contents on the pool.
+
+        Results are yielded as soon as each file finishes, so their order
+        follows completion rather than the walk. At most SEARCH_INFLIGHT files
+        are queued at a time; setting stop cancels whatever is still pending.
+        """
+        pool = self._pool()
+        pending = set()
+        try:
+            for dir_entry in walk_files(root, self.SKIP_DIRS):
+                if stop.is_set():
+                    return
+                if not fnmatch.fnmatch(dir_entry.name, pattern):
+                    continue
+                if matcher is None:
+                    try:
+                        stat = dir_entry.stat()
+                    except OSError:
                         continue
-                except Exception:
+                    yield {'path': dir_entry.path, 'name': dir_entry.name,
+                           'size': stat.st_size, 'last_modified': str(stat.st_mtime),
+                           'match_lines': []}
                     continue
-            results.append(entry)
-            if len(results) >= 100:
-                break
-        return results
+                pending.add(pool.submit(self._scan_file, dir_entry, matcher, stop))
+                if len(pending) >= SEARCH_INFLIGHT:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from (r for r in (f.result() for f in done) if r)
+            for f in as_completed(pending):
+                r = f.result()
+                if r:
+                    yield r
+        finally:
+            for f in pending:
+                f.cancel()
+
+    def search(self, root: str, pattern: str,
+               content_search: str = None, regex: bool = False,
+               case_sensitive: bool = False, max_results: int = 100) -> list[dict]:
+        self._check(root)
+        matcher = self.compile_matcher(content_search, regex, case_sensitive) if content_search else None
+        stop = threading.Event()
+        results = self._iter_search(root, pattern, matcher, stop)
+        try:
+            return list(itertools.islice(results, max_results))
+        finally:
+            stop.set()
+            results.close()
+
+    async def search_stream(self, root: str, pattern: str,
+                            content_search: str = None, regex: bool = False,
+                            case_sensitive: bool = False,
+                            max_results: int = 1000) -> AsyncGenerator[dict, None]:
+        """Stream search results as files are matched, without blocking the event loop."""
+        self._check(root)
+        matcher = self.compile_matcher(content_search, regex, case_sensitive) if content_search else None
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for r in itertools.islice(self._iter_search(root, pattern, matcher, stop), max_results):
+                    loop.call_soon_threadsafe(queue.put_nowait, r)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Consumer went away (or finished): let the walker and scanners stop early
+            stop.set()
+            await asyncio.shield(producer)
 
     async def run(self, command: str, cwd: str = None,
                   timeout: float = 30.0) -> CommandResult:
@@ -192,24 +545,104 @@ class FileManager:
                 duration_ms=(time.perf_counter()-start)*1000)
 
     async def run_stream(
-        self, command: str, cwd: str = None
+        self, command: str, cwd: str = None,
+        batch_interval: float = RUN_BATCH_INTERVAL, batch_bytes: int = RUN_BATCH_BYTES
     ) -> AsyncGenerator[dict, None]:
+        """Run a shell command, yielding its output as batched frames.
+
+        stdout and stderr are read concurrently into one bounded queue, so
+        lines keep their arrival order and a chatty stderr can't block the
+        process. Lines are grouped into {'type': 'output', 'lines': [...]}
+        frames, flushed every batch_interval seconds or batch_bytes of text;
+        each line carries its stream and 't', seconds since start. A slow
+        consumer fills the queue, which stops the pipes being drained and so
+        throttles the process itself. Closing the generator kills the process.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
         proc = await asyncio.create_subprocess_shell(
             command,
             cwd=cwd or os.getcwd(),
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
+            limit=RUN_LINE_LIMIT,
+            # Own process group, so killing it also stops the shell's children
+            start_new_session=os.name == 'posix',
         )
-        async def read_stream(stream, stype):
-            async for line in stream:
-                yield {'type': stype, 'text': line.decode('utf-8','replace').rstrip()}
-        async for evt in read_stream(proc.stdout, 'stdout'):
-            yield evt
-        async for evt in read_stream(proc.stderr, 'stderr'):
-            yield evt
-        await proc.wait()
-        yield {'type': 'done', 'return_code': proc.returncode,
-               'success': proc.returncode == 0}
+        queue: asyncio.Queue = asyncio.Queue(maxsize=RUN_QUEUE_LINES)
+
+        async def pump(stream, stype):
+            cancelled = False
+            try:
+                split = False  # the previous item was a piece of an over-long line
+                while True:
+                    try:
+                        line = await stream.readuntil(b'\n')
+                    except asyncio.IncompleteReadError as e:  # EOF without a trailing newline
+                        line = e.partial
+                    except asyncio.LimitOverrunError as e:
+                        # Line longer than the limit: the bytes are still buffered,
+                        # so pass them on in pieces and keep reading the rest.
+                        line = await stream.read(e.consumed)
+                        split = True
+                    else:
+                        if split and line in (b'\n', b'\r\n'):
+                            split = False  # only the newline ending the split line is left
+                            continue
+                        split = False
+                    if not line:
+                        break
+                    text = line.decode('utf-8', 'replace').rstrip('\r\n')
+                    await queue.put({'stream': stype, 'text': text,
+                                     't': round(loop.time() - started, 3)})
+            except asyncio.CancelledError:
+                cancelled = True  # the consumer is gone: a put on a full queue would never return
+                raise
+            finally:
+                if not cancelled:
+                    await queue.put(None)
+
+        pumps = [asyncio.create_task(pump(proc.stdout, 'stdout')),
+                 asyncio.create_task(pump(proc.stderr, 'stderr'))]
+        try:
+            open_streams, batch, size, deadline = len(pumps), [], 0, 0.0
+            while open_streams:
+                try:
+                    timeout = max(deadline - loop.time(), 0) if batch else None
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield {'type': 'output', 'lines': batch}
+                    batch, size = [], 0
+                    continue
+                if item is None:
+                    open_streams -= 1
+                    continue
+                if not batch:
+                    deadline = loop.time() + batch_interval
+                batch.append(item)
+                size += len(item['text'])
+                if size >= batch_bytes or batch_interval <= 0:
+                    yield {'type': 'output', 'lines': batch}
+                    batch, size = [], 0
+            if batch:
+                yield {'type': 'output', 'lines': batch}
+            await proc.wait()
+            yield {'type': 'done', 'return_code': proc.returncode,
+                   'success': proc.returncode == 0,
+                   'duration_ms': (loop.time() - started) * 1000}
+        finally:
+            if proc.returncode is None:
+                try:
+                    if os.name == 'posix':
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    else:
+                        proc.kill()
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+            for task in pumps:
+                task.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
 
     def get_drives(self) -> list[dict]:
         drives = []
@@ -0,0 +1,36 @@
+# backend/src/system/fs_walk.py
+import os
+from typing import Iterable, Iterator, Optional
+
+# Directories never worth descending into when scanning a project
+SKIP_DIRS = frozenset({'node_modules', '.git', '__pycache__', 'venv', '.venv',
+                       'dist', 'build', '.next', 'target', 'vendor', '.idea', '.vscode'})
+
+def walk_files(root, skip_dirs: Iterable[str] = SKIP_DIRS,
+               suffixes: Optional[Iterable[str]] = None) -> Iterator[os.DirEntry]:
+    """Yield a DirEntry for every file under root.
+
+    Built on os.scandir with an explicit stack: skipped directories are
+    pruned by name before they are opened, and the yielded entries carry the
+    type (and on Windows the stat) information scandir already fetched, so
+    callers can use entry.stat() without another lookup per file. Symlinked
+    directories are not followed; unreadable directories are skipped.
+    """
+    skip = skip_dirs if isinstance(skip_dirs, (set, frozenset)) else set(skip_dirs)
+    suffixes = tuple(suffixes) if suffixes is not None else None
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in skip:
+                            stack.append(entry.path)
+                    elif entry.is_file() and (suffixes is None or entry.name.endswith(suffixes)):
+                        yield entry
+                except OSError:
+                    continue
@@ -0,0 +1,305 @@
+# backend/src/system/shell_sessions.py
+import os
+import re
+import time
+import uuid
+import signal
+import struct
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple
+try:
+    import pty
+    import fcntl
+    import termios
+except ImportError:  # Windows: no PTYs
+    pty = None
+
+logger = logging.getLogger('shell_sessions')
+
+SHELL = os.getenv("VIBECODER_SHELL", os.getenv("SHELL", "/bin/bash"))
+MAX_SESSIONS = int(os.getenv("SHELL_MAX_SESSIONS", "8"))
+IDLE_TIMEOUT = float(os.getenv("SHELL_IDLE_TIMEOUT", "1800"))  # seconds without use or clients
+REAP_INTERVAL = 60.0
+RING_BYTES = int(os.getenv("SHELL_RING_BYTES", str(1024 * 1024)))  # scrollback kept per session
+READ_BYTES = 65536
+
+class ShellSession:
+    """A long-lived interactive shell on a pseudo-terminal.
+
+    Output goes into a ring buffer addressed by absolute byte offset;
+    clients remember the offset they have seen and read() from it, so a
+    reconnecting client catches up on whatever the ring still holds and a
+    slow one never makes the shell wait. Any number of clients can attach.
+    """
+    def __init__(self, workspace: str):
+        self.id = str(uuid.uuid4())
+        self.workspace = workspace
+        self.created = time.time()
+        self.last_active = time.monotonic()
+        self.clients = 0
+        self.closed = False
+        self._chunks: deque = deque()  # (offset, bytes)
+        self._size = 0
+        self.offset = 0  # total bytes ever produced
+        self._changed = asyncio.Event()
+        self._run_lock = asyncio.Lock()
+        self._tap: Optional[bytearray] = None  # output of the run() in progress
+        self._master = None
+        self.proc = None
+
+    async def start(self, rows: int = 40, cols: int = 200):
+        master, slave = pty.openpty()
+        self._master = master
+        self.resize(rows, cols)
+        env = {**os.environ, 'TERM': 'xterm-256color'}
+
+        def make_controlling_tty():
+            # start_new_session already called setsid(); adopt the PTY
+            fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+        try:
+            self.proc = await asyncio.create_subprocess_exec(
+                SHELL, '-i', stdin=slave, stdout=slave, stderr=slave,
+                cwd=self.workspace, env=env, start_new_session=True,
+                preexec_fn=make_controlling_tty)
+        finally:
+            os.close(slave)
+        os.set_blocking(master, False)
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._master, READ_BYTES)
+        except BlockingIOError:
+            return
+        except OSError:  # EIO: the shell exited
+            data = b''
+        if not data:
+            self._mark_closed()
+            return
+        if self._tap is not None:
+            self._tap += data
+        self._chunks.append((self.offset, data))
+        self.offset += len(data)
+        self._size += len(data)
+        while self._size > RING_BYTES and len(self._chunks) > 1:
+            _, old = self._chunks.popleft()
+            self._size -= len(old)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _mark_closed(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            asyncio.get_running_loop().remove_reader(self._master)
+        except (RuntimeError, ValueError):
+            pass
+        self._changed.set()
+
+    def read(self, since: int) -> Tuple[int, bytes]:
+        """(start offset, bytes) of buffered output at or after since.
+
+        start is later than since when the ring has already dropped the
+        bytes in between.
+        """
+        parts, start = [], None
+        for offset, data in self._chunks:
+            end = offset + len(data)
+            if end <= since:
+                continue
+            cut = max(since - offset, 0)
+            if start is None:
+                start = offset + cut
+            parts.append(data[cut:])
+        return (start if start is not None else self.offset), b''.join(parts)
+
+    async def wait(self, since: int, timeout: float = None) -> None:
+        """Return once output beyond since exists, the shell closed, or timeout passed."""
+        if self.offset > since or self.closed:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def write(self, data: str | bytes) -> None:
+        if self.closed:
+            raise RuntimeError('Shell session has exited')
+        self.last_active = time.monotonic()
+        os.write(self._master, data.encode('utf-8') if isinstance(data, str) else data)
+
+    def resize(self, rows: int, cols: int) -> None:
+        fcntl.ioctl(self._master, termios.TIOCSWINSZ, struct.pack('HHHH', rows, cols, 0, 0))
+
+    async def run(self, command: str, timeout: float = 30.0) -> dict:
+        """Run one command in the shell and return its output and exit code.
+
+        The command is bracketed by printf markers with a per-call nonce;
+        the terminal's echo of the command line never matches because it
+        shows the unexpanded format string, not the printed marker. The
+        prompt line echoing the closing printf is cut from the output.
+
+        Output is collected in the run's own buffer as it arrives, so it
+        survives the scrollback ring wrapping, and each wake-up only scans
+        the bytes that are new since the last one.
+        """
+        async with self._run_lock:
+            nonce = uuid.uuid4().hex[:12]
+            start_re = re.compile(rb'__VC_START_' + nonce.encode() + rb'__\r?\n')
+            done_re = re.compile(rb'__VC_DONE_' + nonce.encode() + rb'_(\d+)__')
+            done_echo = f"printf '__VC_DONE_{nonce}".encode()
+            overlap = 64  # longer than either marker, so one split across reads is still found
+            buf = self._tap = bytearray()
+            since = self.offset
+            start_at = None  # absolute offset of the command's first output byte
+            scanned = 0
+            started = time.perf_counter()
+            try:
+                self.write(f"printf '__VC_START_{nonce}__\\n'; {command}\n"
+                           f"printf '__VC_DONE_{nonce}_%s__\\n' $?\n")
+                deadline = time.monotonic() + timeout
+                while True:
+                    done = None
+                    if start_at is None:
+                        start = start_re.search(buf, max(scanned - overlap, 0))
+                        if start:
+                            start_at = since + start.end()
+                            del buf[:start.end()]  # keep only the command's output
+                            since, scanned = start_at, 0
+                    if start_at is not None:
+                        done = done_re.search(buf, max(scanned - overlap, 0))
+                    scanned = len(buf)
+                    if done:
+                        raw = bytes(buf[:done.start()])
+                        echo = raw.rfind(done_echo)
+                        if echo != -1:
+                            raw = raw[:raw.rfind(b'\n', 0, echo) + 1]
+                        output = raw.decode('utf-8', 'replace')
+                        code = int(done.group(1))
+                        break
+                    remaining = deadline - time.monotonic()
+                    if self.closed or remaining <= 0:
+                        if not self.closed:
+                            self.write(b'\x03')  # Ctrl-C the stuck command, keep the shell
+                        output = bytes(buf).decode('utf-8', 'replace') if start_at is not None else ''
+                        code = -1
+                        break
+                    await self.wait(since + len(buf), remaining)
+            finally:
+                self._tap = None
+            self.last_active = time.monotonic()
+            return {'command': command, 'output': output.replace('\r\n', '\n'),
+                    'return_code': code, 'success': code == 0,
+                    'timed_out': code == -1 and not self.closed,
+                    'duration_ms': (time.perf_counter() - started) * 1000}
+
+    async def close(self) -> None:
+        self._mark_closed()
+        if self.proc and self.proc.returncode is None:
+            try:
+                os.killpg(self.proc.pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(self.proc.wait(), 2.0)
+            except asyncio.TimeoutError:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+                await self.proc.wait()
+        if self._master is not None:
+            os.close(self._master)
+            self._master = None
+
+    def info(self) -> dict:
+        return {'id': self.id, 'workspace': self.workspace, 'created': self.created,
+                'idle_seconds': round(time.monotonic() - self.last_active, 1),
+                'clients': self.clients, 'offset': self.offset, 'closed': self.closed}
+
+class ShellSessionManager:
+    """One ShellSession per workspace, at most MAX_SESSIONS at a time.
+
+    Sessions without attached clients that have been idle for IDLE_TIMEOUT
+    are closed by a background reaper; when the cap is reached the least
+    recently used unattached session is evicted to make room.
+    """
+    def __init__(self, max_sessions: int = MAX_SESSIONS, idle_timeout: float = IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, ShellSession] = {}  # workspace -> session
+        self._lock = asyncio.Lock()
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def get_or_create(self, workspace: str) -> ShellSession:
+        if pty is None:
+            raise RuntimeError('Shell sessions require a POSIX system with PTY support')
+        workspace = os.path.realpath(workspace)
+        if not os.path.isdir(workspace):
+            raise ValueError(f'Directory not found: {workspace}')
+        async with self._lock:
+            session = self._sessions.get(workspace)
+            if session and not session.closed:
+                session.last_active = time.monotonic()
+                return session
+            if session:
+                await session.close()
+                del self._sessions[workspace]
+            if len(self._sessions) >= self.max_sessions:
+                idle = [s for s in self._sessions.values() if s.clients == 0]
+                if not idle:
+                    raise RuntimeError(f'Too many shell sessions (max {self.max_sessions})')
+                victim = min(idle, key=lambda s: s.last_active)
+                await self._close(victim)
+            session = ShellSession(workspace)
+            await session.start()
+            self._sessions[workspace] = session
+            if self._reaper is None or self._reaper.done():
+                self._reaper = asyncio.create_task(self._reap())
+            logger.info(f'Started shell session {session.id} in {workspace}')
+            return session
+
+    def get(self, session_id: str) -> Optional[ShellSession]:
+        return next((s for s in self._sessions.values() if s.id == session_id), None)
+
+    def list(self) -> list[dict]:
+        return [s.info() for s in self._sessions.values()]
+
+    async def _close(self, session: ShellSession):
+        self._sessions.pop(session.workspace, None)
+        await session.close()
+
+    async def close(self, session_id: str) -> bool:
+        async with self._lock:
+            session = self.get(session_id)
+            if session is None:
+                return False
+            await self._close(session)
+            return True
+
+    async def _reap(self):
+        while self._sessions:
+            await asyncio.sleep(REAP_INTERVAL)
+            now = time.monotonic()
+            async with self._lock:
+                for session in list(self._sessions.values()):
+                    if session.closed or (session.clients == 0 and
+                                          now - session.last_active > self.idle_timeout):
+                        logger.info(f'Reaping shell session {session.id} ({session.workspace})')
+                        await self._close(session)
+
+    async def close_all(self):
+        async with self._lock:
+            for session in list(self._sessions.values()):
+                await self._close(session)
+        if self._reaper:
+            self._reaper.cancel()
+
+# Singleton instance
+_shells = None
+def get_shell_sessions() -> ShellSessionManager:
+    global _shells
+    if _shells is None:
+        _shells = ShellSessionManager()
+    return _shells
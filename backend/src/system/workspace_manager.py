@@ -1,8 +1,10 @@
-﻿import json, uuid, asyncio, subprocess, logging
+﻿import json, uuid, asyncio, subprocess, logging, threading, fnmatch, os
+from collections import Counter
 from pathlib import Path
 from dataclasses import dataclass, field, asdict
 from datetime import datetime
 from typing import AsyncGenerator
+from src.system.fs_walk import walk_files
 
 logger = logging.getLogger('workspace')
 
@@ -19,6 +21,16 @@ class WorkspaceProject:
     has_tests: bool
 
 REGISTRY_PATH = Path.home() / '.vibecoder' / 'workspaces.json'
+FILE_COUNT_CAP = 5000
+TEST_PATTERNS = ('test_*.py', '*.test.*', '*.spec.*')
+LANGUAGE_EXTENSIONS = [('.py','python'),('.ts','typescript'),('.js','javascript'),
+                       ('.rs','rust'),('.go','go'),('.java','java'),('.swift','swift')]
+
+@dataclass
+class ProjectScan:
+    file_count: int
+    extensions: Counter
+    has_tests: bool
 
 class WorkspaceManager:
     def __init__(self):
@@ -38,7 +50,17 @@ class WorkspaceManager:
         data = {k: asdict(v) for k, v in self._projects.items()}
         REGISTRY_PATH.write_text(json.dumps(data, indent=2))
 
-    def _detect_language(self, root: Path) -> str:
+    def _scan(self, root: Path) -> ProjectScan:
+        """File count, extension histogram and test presence from one pruned walk."""
+        count, extensions, has_tests = 0, Counter(), False
+        for entry in walk_files(root):
+            count += 1
+            extensions[os.path.splitext(entry.name)[1]] += 1
+            if not has_tests:
+                has_tests = any(fnmatch.fnmatch(entry.name, pat) for pat in TEST_PATTERNS)
+        return ProjectScan(min(count, FILE_COUNT_CAP), extensions, has_tests)
+
+    def _detect_language(self, root: Path, scan: ProjectScan = None) -> str:
         checks = [
             (['package.json'], 'javascript'),
             (['tsconfig.json', 'tsconfig.base.json'], 'typescript'),
@@ -52,9 +74,9 @@ class WorkspaceManager:
         for files, lang in checks:
             if any((root / f).exists() for f in files):
                 return lang
-        for ext, lang in [('.py','python'),('.ts','typescript'),('.js','javascript'),
-                          ('.rs','rust'),('.go','go'),('.java','java'),('.swift','swift')]:
-            if list(root.rglob(f'*{ext}')):
+        scan = scan or self._scan(root)
+        for ext, lang in LANGUAGE_EXTENSIONS:
+            if scan.extensions[ext]:
                 return lang
         return 'unknown'
 
@@ -90,40 +112,55 @@ class WorkspaceManager:
             pass
         return None
 
-    def _count_files(self, root: Path) -> int:
-        skip = {'node_modules', '.git', '__pycache__', 'venv', '.venv',
-                'dist', 'build', 'target', '.next'}
-        count = 0
-        for p in root.rglob('*'):
-            if p.is_file() and not any(s in p.parts for s in skip):
-                count += 1
-                if count >= 5000: break
-        return count
-
     def open_project(self, path: str) -> WorkspaceProject:
         root = Path(path).resolve()
         if not root.exists() or not root.is_dir():
             raise ValueError(f'Directory not found: {path}')
-        language = self._detect_language(root)
+        scan = self._scan(root)
+        language = self._detect_language(root, scan)
         commands = self._detect_run_commands(root, language)
         branch = self._get_git_branch(str(root))
-        count = self._count_files(root)
-        has_tests = any(root.rglob('test_*.py')) or any(root.rglob('*.test.*')) or any(root.rglob('*.spec.*'))
         proj = WorkspaceProject(
             id=str(uuid.uuid4()),
             name=root.name,
             path=str(root),
             language=language,
             last_opened=datetime.utcnow().isoformat(),
-            file_count=count,
+            file_count=scan.file_count,
             git_branch=branch,
             run_commands=commands,
-            has_tests=has_tests,
+            has_tests=scan.has_tests,
         )
         self._projects[proj.id] = proj
         self._save()
+        from src.core.graph_utils import set_project_root
+        set_project_root(str(root))
+        threading.Thread(target=self._load_graph, args=(str(root),), daemon=True).start()
+        threading.Thread(target=self._index_project, args=(str(root),), daemon=True).start()
         return proj
 
+    def _load_graph(self, path: str) -> None:
+        """Build (or incrementally refresh) the shared code graph for a project."""
+        try:
+            from src.gnn.graph_builder import get_codebase_graph
+            get_codebase_graph(path)
+        except Exception as e:
+            logger.warning(f'Could not build code graph for {path}: {e}')
+
+    def _index_project(self, path: str) -> None:
+        """Build (or sync) the project's search and symbol indexes."""
+        try:
+            from src.retrieval.bm25_index import get_bm25
+            get_bm25(path)
+        except Exception as e:
+            logger.warning(f'Could not build search index for {path}: {e}')
+        try:
+            from src.ast.symbol_index import get_symbol_index
+            stats = get_symbol_index(path).sync()
+            logger.info(f'Symbol index for {path}: {stats}')
+        except Exception as e:
+            logger.warning(f'Could not build symbol index for {path}: {e}')
+
     def list_projects(self) -> list[WorkspaceProject]:
         return sorted(self._projects.values(), key=lambda p: p.last_opened, reverse=True)
 
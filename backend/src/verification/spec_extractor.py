@@ -1,6 +1,6 @@
 ﻿# backend/src/verification/spec_extractor.py
 import re
-import ollama
+from src.core.ollama_client import get_ollama
 from typing import List, Dict, Optional
 
 class FunctionSpec:
@@ -34,7 +34,7 @@ Use simple conditions like "x > 0", "result > 0", etc.
 Code:
 {code}
 """
-        response = ollama.generate(model=self.model, prompt=prompt)
+        response = await get_ollama().generate(model=self.model, prompt=prompt)
         try:
             import json
             data = json.loads(response['response'])
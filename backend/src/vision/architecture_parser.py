@@ -1,5 +1,5 @@
 ﻿# backend/src/vision/architecture_parser.py
-import ollama
+from src.core.ollama_client import get_ollama
 import json
 import base64
 from pathlib import Path
@@ -25,7 +25,7 @@ The image shows a {image_type}. Analyze it and output JSON with:
 - tech_stack: list of recommended technologies
 - description: short summary
 Output ONLY valid JSON, no extra text."""
-        response = ollama.generate(model=self.model, prompt=prompt, images=[image_data], system="You are a precise JSON generator.")
+        response = await get_ollama().generate(model=self.model, prompt=prompt, images=[image_data], system="You are a precise JSON generator.")
         try:
             spec = json.loads(response['response'])
             return spec
@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+import sys
+from pathlib import Path
+
+# Tests import the app as `src.*`, the same way main.py does.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
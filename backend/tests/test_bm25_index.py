@@ -0,0 +1,66 @@
+# backend/tests/test_bm25_index.py
+import os
+import pytest
+from src.retrieval.bm25_index import BM25Index
+
+@pytest.fixture
+def workspace(tmp_path):
+    ws = tmp_path / "ws"
+    ws.mkdir()
+    (ws / "auth.py").write_text("token token token\nlogin user\n")
+    (ws / "db.py").write_text("token\nconnect database session\n")
+    (ws / "ui.js").write_text("render button click\n")
+    return ws
+
+@pytest.fixture
+def index(workspace, tmp_path):
+    return BM25Index(str(workspace), str(tmp_path / "bm25.db"))
+
+def paths(index, query, k=10):
+    return [chunk.file_path for _, chunk in index.iter_chunks(index.top_docs(query, k))]
+
+def test_builds_on_first_open(index):
+    assert {d[1] for d in index.docs()} == {"auth.py", "db.py", "ui.js"}
+
+def test_higher_term_frequency_ranks_first(index):
+    assert paths(index, "token") == ["auth.py", "db.py"]
+
+def test_scores_are_positive_and_sorted(index):
+    scored = index.top_docs("token database", 10)
+    scores = [s for _, s in scored]
+    assert scores == sorted(scores, reverse=True) and all(s > 0 for s in scores)
+
+def test_rare_term_outweighs_common_one(index):
+    # "database" appears in one file, "token" in two
+    assert paths(index, "token database")[0] == "db.py"
+
+def test_unknown_or_empty_query(index):
+    assert index.top_docs("nothingmatches", 5) == []
+    assert index.top_docs("", 5) == []
+
+def test_sync_touches_only_changed_files(index, workspace):
+    assert index.sync()["updated"] == 0
+    target = workspace / "ui.js"
+    target.write_text("render modal dialog\n")
+    os.utime(target, (1, 1))  # force an mtime change even on coarse clocks
+    assert index.sync() == {"updated": 1, "removed": 0, "files": 3}
+    assert paths(index, "modal") == ["ui.js"]
+    assert paths(index, "button") == []
+
+def test_touched_but_unchanged_file_is_not_reindexed(index, workspace):
+    os.utime(workspace / "db.py", (2, 2))
+    assert index.sync()["updated"] == 0
+
+def test_sync_drops_deleted_files(index, workspace):
+    (workspace / "db.py").unlink()
+    assert index.sync()["removed"] == 1
+    assert paths(index, "database") == []
+
+def test_remove_dir_drops_everything_under_it(index, workspace):
+    pkg = workspace / "pkg"
+    pkg.mkdir()
+    (pkg / "mod.py").write_text("widget factory\n")
+    (workspace / "pkgx.py").write_text("widget\n")
+    index.sync()
+    index.remove_dir(str(pkg))
+    assert paths(index, "widget") == ["pkgx.py"]
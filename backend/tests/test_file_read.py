@@ -0,0 +1,60 @@
+# backend/tests/test_file_read.py
+import pytest
+from src.system.file_manager import FileManager
+
+@pytest.fixture
+def fm():
+    return FileManager()
+
+def write(tmp_path, name, data: bytes):
+    p = tmp_path / name
+    p.write_bytes(data)
+    return str(p)
+
+def test_whole_file(fm, tmp_path):
+    r = fm.read(write(tmp_path, "a.txt", b"hello\nworld\n"))
+    assert r["content"] == "hello\nworld\n" and r["encoding"] == "utf-8" and r["size_bytes"] == 12
+
+def test_byte_range(fm, tmp_path):
+    r = fm.read(write(tmp_path, "a.txt", b"0123456789"), offset=2, length=3)
+    assert (r["content"], r["offset"], r["length"], r["eof"]) == ("234", 2, 3, False)
+    r = fm.read(write(tmp_path, "b.txt", b"0123456789"), offset=8)
+    assert (r["content"], r["eof"]) == ("89", True)
+
+def test_range_past_end_is_empty(fm, tmp_path):
+    r = fm.read(write(tmp_path, "a.txt", b"abc"), offset=10, length=5)
+    assert r["content"] == "" and r["eof"]
+
+def test_line_range(fm, tmp_path):
+    path = write(tmp_path, "a.txt", b"".join(b"line %d\n" % i for i in range(1, 11)))
+    r = fm.read(path, start_line=3, end_line=4)
+    assert r["content"] == "line 3\nline 4\n" and r["start_line"] == 3
+    assert fm.read(path, start_line=10)["content"] == "line 10\n"
+
+def test_range_never_splits_a_utf8_character(fm, tmp_path):
+    path = write(tmp_path, "u.txt", "aé€b".encode("utf-8"))  # a, 2-byte, 3-byte, b
+    r = fm.read(path, offset=2, length=3)  # starts inside "é", ends inside "€"
+    assert r["content"] == ""
+    r = fm.read(path, offset=1, length=5)
+    assert r["content"] == "é€"
+
+@pytest.mark.parametrize("data, encoding, text", [
+    ("héllo".encode("utf-8-sig"), "utf-8-sig", "héllo"),
+    ("héllo".encode("utf-16"), "utf-16", "héllo"),
+    ("héllo".encode("latin-1") + b" plain ascii tail" * 2, "latin-1", "héllo" + " plain ascii tail" * 2),
+])
+def test_encodings(fm, tmp_path, data, encoding, text):
+    r = fm.read(write(tmp_path, "e.txt", data))
+    assert (r["encoding"], r["content"]) == (encoding, text)
+
+def test_binary_is_base64(fm, tmp_path):
+    r = fm.read(write(tmp_path, "b.bin", b"\x00\x01\x02"))
+    assert r["encoding"] == "base64" and r["content"] == "AAEC"
+
+def test_bom_is_not_decoded_mid_file(fm, tmp_path):
+    r = fm.read(write(tmp_path, "a.txt", "abc".encode("utf-8-sig")), offset=4)
+    assert (r["encoding"], r["content"]) == ("utf-8", "bc")
+
+def test_blocked_path_is_refused(fm):
+    with pytest.raises(PermissionError):
+        fm.read("/etc/shadow")
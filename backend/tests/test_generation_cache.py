@@ -0,0 +1,26 @@
+# backend/tests/test_generation_cache.py
+from src.core.generation_cache import cache_key, GenerationCache
+
+BASE = ("Build a todo app", "python", "system prompt")
+
+def test_prompt_whitespace_and_case_are_normalized():
+    assert cache_key(*BASE) == cache_key("  build a   TODO app ", "python", "system prompt")
+
+def test_every_input_changes_the_key():
+    key = cache_key(*BASE)
+    assert cache_key("Build a chat app", "python", "system prompt") != key
+    assert cache_key("Build a todo app", "typescript", "system prompt") != key
+    assert cache_key("Build a todo app", "python", "other system") != key
+    assert cache_key(*BASE, extra_context="context") != key
+    assert cache_key(*BASE, project="/work/a") != key
+    assert cache_key(*BASE, project="/work/a") != cache_key(*BASE, project="/work/b")
+
+def test_fields_do_not_run_together():
+    assert cache_key("a", "b", "c", "d") != cache_key("a", "b", "cd", "")
+
+def test_put_get_roundtrip(tmp_path):
+    cache = GenerationCache(str(tmp_path / "gen.db"))
+    key = cache_key(*BASE)
+    assert cache.get(key) is None
+    cache.put(key, {"app.py": "print('hi')"}, "python")
+    assert cache.get(key) == {"app.py": "print('hi')"}
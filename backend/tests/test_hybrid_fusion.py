@@ -0,0 +1,65 @@
+# backend/tests/test_hybrid_fusion.py
+import asyncio
+import numpy as np
+from src.retrieval.hybrid_rag import CodeChunk, HybridRetriever
+
+class FakeBM25:
+    def __init__(self, ranked):
+        self.ranked = ranked
+
+    def top_docs(self, query, top_k):
+        return self.ranked[:top_k]
+
+    def iter_chunks(self, scored):
+        for doc_id, score in scored:
+            yield doc_id, CodeChunk(f"f{doc_id}.py", f"doc {doc_id}", 1, 1, score, "bm25")
+
+class FakeDense:
+    pending = 0
+
+    def __init__(self, ranked, fail=False):
+        self.ranked = ranked
+        self.fail = fail
+
+    async def refresh(self, bm25, embed=True):
+        if self.fail:
+            raise ConnectionError("ollama down")
+
+    async def embed(self, text):
+        return np.ones(3, dtype=np.float32)
+
+    def search(self, query_vec, top_k):
+        return self.ranked[:top_k]
+
+def retrieve(sparse, dense, top_k=8, fail=False):
+    retriever = HybridRetriever(bm25=FakeBM25(sparse), dense=FakeDense(dense, fail))
+    return asyncio.run(retriever.retrieve("query", top_k=top_k))
+
+def test_docs_found_by_both_retrievers_rank_first():
+    chunks = retrieve([(1, 9.0), (2, 5.0), (3, 1.0)], [(3, 0.9), (4, 0.8)])
+    assert chunks[0].file_path == "f3.py"
+    assert chunks[0].source == "bm25+dense"
+    assert {c.file_path for c in chunks} == {"f1.py", "f2.py", "f3.py", "f4.py"}
+
+def test_fusion_uses_ranks_not_raw_scores():
+    # Equal ranks on opposite sides tie however different the raw scores are
+    chunks = retrieve([(1, 1000.0)], [(2, 0.01)])
+    assert {c.file_path for c in chunks} == {"f1.py", "f2.py"}
+
+def test_top_k_keeps_the_best_fused_scores():
+    sparse = [(i, float(10 - i)) for i in range(10)]
+    dense = [(i, 1.0 - i / 10) for i in range(10)]
+    chunks = retrieve(sparse, dense, top_k=3)
+    assert [c.file_path for c in chunks] == ["f0.py", "f1.py", "f2.py"]
+
+def test_dense_failure_falls_back_to_bm25():
+    chunks = retrieve([(1, 2.0), (2, 1.0)], [(3, 0.9)], fail=True)
+    assert [c.file_path for c in chunks] == ["f1.py", "f2.py"]
+    assert all(c.source == "bm25" for c in chunks)
+
+def test_context_string_respects_token_budget():
+    retriever = HybridRetriever(bm25=FakeBM25([]), dense=FakeDense([]))
+    chunks = [CodeChunk("a.py", "x" * 400, 1, 5, 1.0, "bm25"),
+              CodeChunk("b.py", "y" * 40, 1, 2, 1.0, "bm25")]
+    text = retriever.build_context_string(chunks, max_tokens=40)
+    assert "b.py" in text and "a.py" not in text
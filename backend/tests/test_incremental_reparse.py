@@ -0,0 +1,65 @@
+# backend/tests/test_incremental_reparse.py
+import pytest
+from src.ast.parser import ASTParser, _common_prefix, _common_suffix, _point
+
+def test_common_prefix_and_suffix():
+    old, new = b"def a():\n    pass\n", b"def a():\n    return 1\n"
+    limit = min(len(old), len(new))
+    start = _common_prefix(old, new, limit)
+    assert old[:start] == new[:start] and old[start] != new[start]
+    end = _common_suffix(old, new, limit - start)
+    assert old[len(old) - end:] == new[len(new) - end:] == b"\n"
+
+def test_prefix_and_suffix_never_overlap_on_repeated_text():
+    old, new = b"aaaa", b"aaaaaa"
+    start = _common_prefix(old, new, 4)
+    assert start == 4 and _common_suffix(old, new, 4 - start) == 0
+
+def test_point_is_row_and_column():
+    src = b"ab\ncde\nf"
+    assert _point(src, 0) == (0, 0)
+    assert _point(src, 4) == (1, 1)
+    assert _point(src, len(src)) == (2, 1)
+
+def test_shift_moves_every_span_and_keeps_methods_shared():
+    method = {"name": "m", "start_line": 3, "end_line": 4}
+    summary = {"functions": [method, {"name": "f", "start_line": 7, "end_line": 8}],
+               "classes": [{"name": "C", "start_line": 2, "end_line": 4, "methods": [method]}],
+               "imports": [{"module": "os"}], "exports": ["C"]}
+    moved = ASTParser._shift(None, summary, 5)
+    assert [(f["start_line"], f["end_line"]) for f in moved["functions"]] == [(8, 9), (12, 13)]
+    assert (moved["classes"][0]["start_line"], moved["classes"][0]["end_line"]) == (7, 9)
+    # A method stays the same object in functions and in its class
+    assert moved["classes"][0]["methods"][0] is moved["functions"][0]
+    assert summary["functions"][0]["start_line"] == 3  # original untouched
+
+@pytest.fixture
+def parser():
+    try:
+        return ASTParser()
+    except Exception as e:  # grammar packages built for another tree-sitter release
+        pytest.skip(f"tree-sitter unavailable: {e}")
+
+SOURCE = '''import os
+
+def first():
+    return 1
+
+class Box:
+    def open(self):
+        pass
+
+def last():
+    return 2
+'''
+
+@pytest.mark.parametrize("edit", [
+    lambda s: s.replace("return 1", "x = 1\n    y = 2\n    return x + y"),  # lines added above
+    lambda s: s.replace("import os\n", ""),                                  # lines removed above
+    lambda s: s.replace("pass", "return 3"),                                # same line count
+    lambda s: s + "\ndef extra():\n    pass\n",                             # appended
+])
+def test_reparse_matches_a_fresh_parse(parser, edit):
+    parser.parse_file("m.py", SOURCE)
+    incremental = parser.parse_file("m.py", edit(SOURCE))
+    assert incremental == ASTParser(cache_size=0).parse_file("m.py", edit(SOURCE))
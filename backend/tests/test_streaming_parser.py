@@ -0,0 +1,46 @@
+# backend/tests/test_streaming_parser.py
+import pytest
+from src.generation import StreamingFileParser, parse_files
+
+RESPONSE = (
+    "Here you go.\n"
+    "=== FILE: app.py ===\n"
+    "print('hi')\n"
+    "=== END FILE ===\n"
+    "=== FILE: lib/util.py ===\n"
+    "def add(a, b):\n"
+    "    return a + b\n"
+    "=== END FILE ===\n"
+)
+
+def feed_in(text: str, size: int):
+    parser = StreamingFileParser()
+    files = []
+    for i in range(0, len(text), size):
+        files += parser.feed(text[i:i + size])
+    return files + parser.finish()
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, len(RESPONSE)])
+def test_chunk_boundaries_match_batch_parse(size):
+    assert dict(feed_in(RESPONSE, size)) == parse_files(RESPONSE)
+
+def test_file_is_emitted_as_soon_as_its_end_marker_arrives():
+    parser = StreamingFileParser()
+    head, tail = RESPONSE.split("=== FILE: lib/util.py")
+    assert parser.feed(head) == [("app.py", "print('hi')")]
+    assert parser.feed("=== FILE: lib/util.py" + tail) == [("lib/util.py", "def add(a, b):\n    return a + b")]
+    assert parser.finish() == []
+
+def test_unterminated_file_is_not_emitted():
+    parser = StreamingFileParser()
+    assert parser.feed("=== FILE: a.py ===\nx = 1\n") == []
+    # No complete block: finish() falls back to parse_files on the raw text
+    assert parser.finish() == list(parse_files("=== FILE: a.py ===\nx = 1\n").items())
+
+def test_finish_falls_back_to_code_fence():
+    files = feed_in("Sure:\n```python\nprint(1)\n```\n", 4)
+    assert files == [("main.py", "print(1)")]
+
+def test_marker_text_inside_a_header_line_is_skipped():
+    files = feed_in("=== FILE: bad\n=== FILE: ok.py ===\nx\n=== END FILE ===\n", 5)
+    assert files == [("ok.py", "x")]
@@ -0,0 +1,24 @@
+# backend/tests/test_topological_levels.py
+from src.agents.parallel_coder_agent import topological_levels
+from src.schemas.file_plan import FilePlanEntry
+
+def entry(path, *imports):
+    return FilePlanEntry(path=path, purpose=path, imports=list(imports))
+
+def paths(levels):
+    return [sorted(e.path for e in level) for level in levels]
+
+def test_independent_files_share_one_level():
+    assert paths(topological_levels([entry("a"), entry("b"), entry("c")])) == [["a", "b", "c"]]
+
+def test_files_come_after_their_imports():
+    levels = topological_levels([entry("app", "api", "db"), entry("api", "db"), entry("db")])
+    assert paths(levels) == [["db"], ["api"], ["app"]]
+
+def test_imports_outside_the_plan_and_self_imports_are_ignored():
+    levels = topological_levels([entry("a", "react", "a"), entry("b", "a")])
+    assert paths(levels) == [["a"], ["b"]]
+
+def test_cycle_is_generated_together_last():
+    levels = topological_levels([entry("x", "y"), entry("y", "x"), entry("base"), entry("z", "base")])
+    assert paths(levels) == [["base"], ["z"], ["x", "y"]]